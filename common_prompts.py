@@ -5,14 +5,36 @@ CLI скрипт для работы с промптами и OpenAI API чер
 
 import os
 import json
+import asyncio
 import sys
 import io
+import hashlib
+import importlib
+import math
+import operator
+import time
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional
-from openai import OpenAI
+import httpx
+from openai import OpenAI, AsyncOpenAI, BadRequestError, DefaultHttpxClient
 from dotenv import load_dotenv
 
+# orjson (опционально) разбирает и сериализует JSON в несколько раз быстрее
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# HTTP/2 в httpx доступен только при установленном пакете h2
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 # Настройка кодировки для корректной работы с Unicode
 try:
     if sys.stdout.encoding != 'utf-8':
@@ -26,96 +48,461 @@ except (AttributeError, TypeError):
 # Загрузка переменных окружения
 load_dotenv()
 
+# Директория локального кэша ответов
+CACHE_DIR = Path(".prompt_cache")
+
+# Эмбеддинги закэшированных вопросов для семантического поиска
+EMBEDDINGS_FILE = CACHE_DIR / "embeddings.json"
+
+# Модель эмбеддингов для семантического кэша
+EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Индекс метаданных промптов, ключ - путь к файлу и его mtime;
+# как и кэш ответов, читается и пишется только при PROMPT_CACHE=1
+PROMPTS_INDEX_FILE = CACHE_DIR / "prompts_index.json"
+
+# Версия формата индекса; при изменении формата индекс строится заново
+PROMPTS_INDEX_VERSION = 2
+
+# Поля промпта, необходимые для вывода списка
+HEADER_FIELDS = ("name", "prompt_id", "category", "description")
+
+# Максимальная длина роли и контекста в списке промптов
+LIST_PREVIEW_LEN = 100
+
+# Количество потоков для параллельной загрузки промптов
+LOAD_WORKERS = 8
+
+# Минимальный интервал между flush stdout при потоковом выводе ответа (сек)
+STREAM_FLUSH_INTERVAL = 0.05
+
+# Максимальная длина строки, которая может быть маркером END (с пробелами)
+END_MARKER_MAX_LEN = 32
+
+# Частота вывода прогресса многострочного ввода (в строках)
+PROGRESS_EVERY = 100
+
+# Разделитель независимых вопросов при пакетной отправке: строка, которая не встречается
+# в обычном тексте и markdown (--- - это горизонтальная линия и front matter)
+QUESTION_SEPARATOR = "%%%"
+
+# Разделительные линии интерфейса
+SEPARATOR_LINE = "=" * 80
+DIVIDER_LINE = "-" * 80
+
+# Важная инструкция о формате ответа (общая для всех промптов)
+MARKDOWN_INSTRUCTION = "⚠️ ВАЖНО: Отвечай в формате читаемого текста с использованием Markdown разметки (заголовки #, ##, списки -, **жирный текст**). НЕ используй JSON формат в ответе!\n"
+
+
+def json_loads(data: bytes):
+    """Разбирает JSON из bytes (через orjson, если он установлен)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj, indent: bool = False) -> bytes:
+    """Сериализует объект в JSON в кодировке UTF-8 (через orjson, если он установлен)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+
+def cache_enabled() -> bool:
+    """Включен ли локальный кэш в .prompt_cache/ (PROMPT_CACHE=1): ответы и индекс промптов"""
+    return os.getenv("PROMPT_CACHE", "0") == "1"
+
+
+def build_system_message(prompt_data: Dict) -> str:
+    """Создает системное сообщение из данных промпта"""
+    # Неизменная для всех промптов инструкция идет первой,
+    # далее поля промпта в фиксированном порядке
+    parts = [MARKDOWN_INSTRUCTION]
+    
+    # Добавляем роль
+    if "role" in prompt_data:
+        parts.append(f"{prompt_data['role']}")
+    
+    # Добавляем контекст
+    if "context" in prompt_data:
+        parts.append(f"\nКОНТЕКСТ: {prompt_data['context']}")
+    
+    # Добавляем описание структуры в текстовом формате
+    if "structure" in prompt_data:
+        parts.append(f"\nФОРМАТ ОТВЕТА:")
+        structure = prompt_data['structure']
+    
+        if 'output_format' in structure:
+            parts.append(f"Формат: {structure['output_format']}")
+    
+        if 'components' in structure:
+            parts.append("\nОтвет должен содержать следующие разделы:")
+            for component in structure['components']:
+                name = component.get('name', '')
+                desc = component.get('description', '')
+                parts.append(f"- {name}: {desc}")
+    
+    # Добавляем требования к формату
+    if "format" in prompt_data:
+        format_info = prompt_data['format']
+        parts.append("\nТРЕБОВАНИЯ:")
+    
+        if 'structure' in format_info:
+            parts.append(f"- {format_info['structure']}")
+        if 'length' in format_info:
+            parts.append(f"- {format_info['length']}")
+        if 'style' in format_info:
+            parts.append(f"- {format_info['style']}")
+        if 'requirements' in format_info:
+            for req in format_info['requirements']:
+                parts.append(f"- {req}")
+    
+    return "\n".join(parts)
+
 
 class PromptsManager:
     """Менеджер для работы с промптами"""
     
     def __init__(self, prompts_dir: str = "prompts"):
         self.prompts_dir = Path(prompts_dir)
-        self.prompts: List[Dict] = []
+        # Метаданные промптов по prompt_id; полные данные читаются по требованию
+        self.prompts: Dict[str, Dict] = {}
+        self._ordered: List[str] = []
+        self._files: Dict[str, Path] = {}
+        self._loaded: Dict[str, Dict] = {}
+        self._list_cache = ""
         self.load_prompts()
     
     def load_prompts(self):
-        """Загружает все промпты из директории"""
+        """Загружает метаданные всех промптов из директории"""
         if not self.prompts_dir.exists():
             print(f"❌ Директория {self.prompts_dir} не найдена!")
             sys.exit(1)
         
         json_files = sorted(self.prompts_dir.glob("*.json"))
         
+        # Метаданные неизмененных файлов берутся из индекса без чтения файлов
+        index = self._read_index()
+        new_index = {}
+        stale_files = []
         for file_path in json_files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    prompt_data = json.load(f)
-                    self.prompts.append(prompt_data)
-            except Exception as e:
-                print(f"⚠️ Ошибка при загрузке {file_path}: {e}")
+            entry = index.get(str(file_path))
+            if entry is None or entry.get("mtime_ns") != file_path.stat().st_mtime_ns:
+                stale_files.append(file_path)
+            else:
+                new_index[str(file_path)] = entry
+        
+        # Файлы читаются параллельно, порядок результатов совпадает с stale_files
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+            results = list(executor.map(self._read_prompt_file, stale_files))
+        
+        for file_path, result in zip(stale_files, results):
+            if isinstance(result, Exception):
+                print(f"⚠️ Ошибка при загрузке {file_path}: {result}")
+            else:
+                new_index[str(file_path)] = {
+                    "mtime_ns": file_path.stat().st_mtime_ns,
+                    "header": self._make_header(result)
+                }
+        
+        for file_path in json_files:
+            entry = new_index.get(str(file_path))
+            if entry is None:
+                continue
+            
+            header = entry["header"]
+            prompt_id = header.get("prompt_id", file_path.stem)
+            if prompt_id in self.prompts:
+                print(f"⚠️ Повторяющийся prompt_id '{prompt_id}' в {file_path}, файл пропущен")
+                continue
+            
+            self.prompts[prompt_id] = header
+            self._files[prompt_id] = file_path
+            self._ordered.append(prompt_id)
         
         if not self.prompts:
             print("❌ Не найдено ни одного промпта!")
             sys.exit(1)
         
+        if new_index != index:
+            self._write_index(new_index)
+        
         print(f"✅ Загружено промптов: {len(self.prompts)}")
+        self._list_cache = self._render_list()
+    
+    @staticmethod
+    def _read_prompt_file(file_path: Path):
+        """Читает один файл промпта, возвращает данные или исключение"""
+        try:
+            # Файл читается целиком одним вызовом read() без текстового слоя,
+            # JSON разбирается сразу из bytes
+            return json_loads(file_path.read_bytes())
+        except Exception as e:
+            return e
+    
+    @staticmethod
+    def _make_header(prompt_data: Dict) -> Dict:
+        """Выделяет из промпта поля, нужные для списка промптов"""
+        header = {key: prompt_data[key] for key in HEADER_FIELDS if key in prompt_data}
+        header["has_test_input"] = bool(prompt_data.get("test_input"))
+        
+        # Роль и контекст обрезаются один раз при построении индекса
+        for field in ("role", "context"):
+            text = prompt_data.get(field, 'N/A')
+            if len(text) > LIST_PREVIEW_LEN:
+                text = text[:LIST_PREVIEW_LEN] + "..."
+            header[f"{field}_short"] = text
+        return header
+    
+    @staticmethod
+    def _read_index() -> Dict:
+        """Читает индекс метаданных промптов"""
+        if not cache_enabled():
+            return {}
+        try:
+            index = json_loads(PROMPTS_INDEX_FILE.read_bytes())
+        except Exception:
+            return {}
+        if index.get("version") != PROMPTS_INDEX_VERSION:
+            return {}
+        return index.get("files", {})
+    
+    @staticmethod
+    def _write_index(index: Dict):
+        """Сохраняет индекс метаданных промптов"""
+        if not cache_enabled():
+            return
+        try:
+            PROMPTS_INDEX_FILE.parent.mkdir(exist_ok=True)
+            PROMPTS_INDEX_FILE.write_bytes(json_dumps({
+                "version": PROMPTS_INDEX_VERSION,
+                "files": index
+            }))
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить индекс промптов: {e}")
     
     def list_prompts(self):
         """Выводит список доступных промптов"""
-        print("\n" + "="*80)
-        print("📋 Доступные промпты:")
-        print("="*80 + "\n")
-        
-        for idx, prompt in enumerate(self.prompts, 1):
-            print(f"{idx}. {prompt.get('name', 'Без названия')}")
-            print(f"   🔖 ID: {prompt.get('prompt_id', 'N/A')}")
-            print(f"   📁 Категория: {prompt.get('category', 'N/A')}")
-            print(f"   📝 Описание: {prompt.get('description', 'N/A')}")
-            
-            # Роль - обрезаем и добавляем многоточие
-            role = prompt.get('role', 'N/A')
-            if len(role) > 100:
-                print(f"   👤 Роль: {role[:100]}...")
-            else:
-                print(f"   👤 Роль: {role}")
-            
-            # Контекст - обрезаем и добавляем многоточие
-            context = prompt.get('context', 'N/A')
-            if len(context) > 100:
-                print(f"   📦 Контекст: {context[:100]}...")
-            else:
-                print(f"   📦 Контекст: {context}")
-            
-            if prompt.get('test_input'):
-                print(f"   ✨ Есть тестовый пример")
+        # Список формируется один раз при загрузке и выводится одной записью
+        sys.stdout.write(self._list_cache)
+        sys.stdout.flush()
+    
+    def _render_list(self) -> str:
+        """Формирует текст списка промптов"""
+        header = "\n".join([
+            "\n" + SEPARATOR_LINE,
+            "📋 Доступные промпты:",
+            SEPARATOR_LINE + "\n"
+        ])
+        
+        blocks = []
+        for idx, prompt_id in enumerate(self._ordered, 1):
+            prompt = self.prompts[prompt_id]
+            block = [
+                f"{idx}. {prompt.get('name', 'Без названия')}",
+                f"   🔖 ID: {prompt.get('prompt_id', 'N/A')}",
+                f"   📁 Категория: {prompt.get('category', 'N/A')}",
+                f"   📝 Описание: {prompt.get('description', 'N/A')}",
+                f"   👤 Роль: {prompt.get('role_short', 'N/A')}",
+                f"   📦 Контекст: {prompt.get('context_short', 'N/A')}"
+            ]
+            if prompt.get('has_test_input'):
+                block.append(f"   ✨ Есть тестовый пример")
             
-            print()
+            blocks.append("\n".join(block))
+        
+        return header + "\n" + "\n\n".join(blocks) + "\n\n"
     
     def get_prompt(self, index: int) -> Optional[Dict]:
-        """Возвращает промпт по индексу"""
-        if 0 < index <= len(self.prompts):
-            return self.prompts[index - 1]
+        """Возвращает промпт по номеру в списке"""
+        if 0 < index <= len(self._ordered):
+            return self.get_by_id(self._ordered[index - 1])
         return None
+    
+    def get_by_id(self, prompt_id: str) -> Optional[Dict]:
+        """Возвращает промпт по prompt_id, полностью загружая его при первом обращении"""
+        if prompt_id not in self.prompts:
+            return None
+        
+        if prompt_id not in self._loaded:
+            file_path = self._files[prompt_id]
+            result = self._read_prompt_file(file_path)
+            if isinstance(result, Exception):
+                print(f"⚠️ Ошибка при загрузке {file_path}: {result}")
+                return None
+            # Системное сообщение собирается один раз для всех запросов с промптом
+            result['_system_message'] = build_system_message(result)
+            self._loaded[prompt_id] = result
+        
+        return self._loaded[prompt_id]
+
+
+@dataclass(frozen=True)
+class OpenAIConfig:
+    """Настройки OpenAI API, прочитанные из переменных окружения"""
+    api_key: Optional[str]
+    base_url: Optional[str]
+    model: str
+    temperature: float
+    max_tokens: int
+    stream: bool
+    max_concurrency: int
+    
+    @classmethod
+    def from_env(cls) -> "OpenAIConfig":
+        """Читает настройки из окружения (вместе с .env)"""
+        base_url = os.getenv("OPENAI_BASE_URL")
+        return cls(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=base_url.strip() if base_url and base_url.strip() else None,
+            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            temperature=float(os.getenv("OPENAI_TEMPERATURE", "0.7")),
+            max_tokens=int(os.getenv("OPENAI_MAX_TOKENS", "2000")),
+            stream=os.getenv("OPENAI_STREAM", "1") == "1",
+            max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+        )
+
+
+# Настройки читаются один раз при загрузке модуля
+DEFAULT_CONFIG = OpenAIConfig.from_env()
+
+
+class ResponseCache:
+    """
+    Локальный кэш ответов API на диске (включается через PROMPT_CACHE=1)
+    
+    Ключ строится по точному тексту вопроса: код, отличающийся отступами или
+    регистром, не получает чужой ответ. При PROMPT_CACHE_SEMANTIC=1 дополнительно
+    ищется близкий по смыслу вопрос по косинусной близости эмбеддингов.
+    """
+    
+    def __init__(self, cache_dir: Path = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.enabled = cache_enabled()
+        self.semantic = self.enabled and os.getenv("PROMPT_CACHE_SEMANTIC", "0") == "1"
+        self.threshold = float(os.getenv("PROMPT_CACHE_THRESHOLD", "0.95"))
+        self._embeddings: Optional[List[Dict]] = None
+    
+    @staticmethod
+    def make_scope(model: str, temperature: float, max_tokens: int,
+                   system_message: str) -> str:
+        """Вычисляет ключ параметров запроса без учета вопроса"""
+        payload = json.dumps({
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "system_message": system_message
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def make_key(scope: str, user_question: str) -> str:
+        """Вычисляет ключ кэша по параметрам запроса и точному тексту вопроса"""
+        return hashlib.sha256(f"{scope}\n{user_question}".encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """Возвращает сохраненный ответ или None"""
+        if not self.enabled:
+            return None
+        
+        cache_file = self.cache_dir / f"{key}.json"
+        if not cache_file.exists():
+            return None
+        
+        try:
+            return json_loads(cache_file.read_bytes())
+        except Exception as e:
+            print(f"⚠️ Не удалось прочитать кэш {cache_file}: {e}")
+            return None
+    
+    def set(self, key: str, result: Dict):
+        """Сохраняет ответ в кэш"""
+        if not self.enabled:
+            return
+        
+        try:
+            self.cache_dir.mkdir(exist_ok=True)
+            (self.cache_dir / f"{key}.json").write_bytes(json_dumps(result, indent=True))
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить ответ в кэш: {e}")
+    
+    def find_similar(self, scope: str, embedding: List[float]) -> Optional[Dict]:
+        """Возвращает ответ на самый близкий вопрос, если близость не ниже порога"""
+        best_key = None
+        best_score = self.threshold
+        for entry in self._load_embeddings():
+            if entry["scope"] != scope:
+                continue
+            score = sum(map(operator.mul, entry["embedding"], embedding))
+            if score >= best_score:
+                best_key, best_score = entry["key"], score
+        
+        if best_key is None:
+            return None
+        return self.get(best_key)
+    
+    def add_embedding(self, scope: str, key: str, embedding: List[float]):
+        """Сохраняет эмбеддинг вопроса для семантического поиска"""
+        entries = self._load_embeddings()
+        entries.append({"scope": scope, "key": key, "embedding": embedding})
+        try:
+            self.cache_dir.mkdir(exist_ok=True)
+            EMBEDDINGS_FILE.write_bytes(json_dumps(entries))
+        except Exception as e:
+            print(f"⚠️ Не удалось сохранить эмбеддинги кэша: {e}")
+    
+    def _load_embeddings(self) -> List[Dict]:
+        """Загружает эмбеддинги закэшированных вопросов (один раз за сессию)"""
+        if self._embeddings is None:
+            try:
+                self._embeddings = json_loads(EMBEDDINGS_FILE.read_bytes())
+            except Exception:
+                self._embeddings = []
+        return self._embeddings
+    
+    @staticmethod
+    def normalize(embedding: List[float]) -> List[float]:
+        """Приводит вектор к единичной длине, чтобы скалярное произведение было косинусом"""
+        norm = math.sqrt(sum(x * x for x in embedding))
+        if not norm:
+            return embedding
+        return [x / norm for x in embedding]
 
 
 class OpenAIClient:
     """Клиент для работы с OpenAI API через ProxyAPI"""
     
-    def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.base_url = os.getenv("OPENAI_BASE_URL")
-        self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-        self.temperature = float(os.getenv("OPENAI_TEMPERATURE", "0.7"))
-        self.max_tokens = int(os.getenv("OPENAI_MAX_TOKENS", "2000"))
+    def __init__(self, config: Optional[OpenAIConfig] = None):
+        self.config = config or DEFAULT_CONFIG
+        self.api_key = self.config.api_key
+        self.base_url = self.config.base_url
+        # Параметры модели можно изменить в течение сессии (configure_model)
+        self.model = self.config.model
+        self.temperature = self.config.temperature
+        self.max_tokens = self.config.max_tokens
         
         if not self.api_key:
             print("❌ OPENAI_API_KEY не найден в .env файле!")
             sys.exit(1)
         
+        # HTTP-клиент с keep-alive: соединение (TCP + TLS) переиспользуется
+        # между запросами сессии, HTTP/2 включается при наличии пакета h2
+        http_client = DefaultHttpxClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=60)
+        )
+        
         # Инициализация клиента OpenAI с ProxyAPI
-        if self.base_url and self.base_url.strip():
+        if self.base_url:
             print(f"🌐 Используется ProxyAPI: {self.base_url}")
-            self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+            self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http_client)
         else:
             print("🌐 Используется стандартный OpenAI API")
-            self.client = OpenAI(api_key=self.api_key)
+            self.client = OpenAI(api_key=self.api_key, http_client=http_client)
+        
+        self.stream = self.config.stream
+        self.max_concurrency = self.config.max_concurrency
+        self.cache = ResponseCache()
     
     def send_request(self, prompt_data: Dict, user_question: str) -> Dict:
         """
@@ -129,7 +516,7 @@ class OpenAIClient:
             Dict с ответом и метаинформацией
         """
         # Формируем системное сообщение из промпта
-        system_message = self._build_system_message(prompt_data)
+        system_message = self._get_system_message(prompt_data)
         
         # Формируем сообщения для API
         messages = [
@@ -137,81 +524,199 @@ class OpenAIClient:
             {"role": "user", "content": user_question}
         ]
         
+        # Проверяем локальный кэш ответов
+        scope = self.cache.make_scope(self.model, self.temperature, self.max_tokens, system_message)
+        cache_key = self.cache.make_key(scope, user_question)
+        cached = self.cache.get(cache_key)
+        
+        # Если точного совпадения нет, ищем близкий по смыслу вопрос
+        embedding = None
+        if cached is None and self.cache.semantic:
+            embedding = self._embed(user_question)
+            if embedding is not None:
+                cached = self.cache.find_similar(scope, embedding)
+        
+        if cached is not None:
+            print("\n⚡ Ответ получен из локального кэша")
+            return cached
+        
         try:
             print("\n🔄 Отправляем запрос к OpenAI...")
             
-            # Отправляем запрос
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
+            # Потоковый режим: ответ выводится по мере генерации
+            stream = None
+            if self.stream:
+                try:
+                    stream = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens,
+                        stream=True,
+                        stream_options={"include_usage": True}
+                    )
+                except BadRequestError as e:
+                    # Сервер отклонил stream/stream_options (например, ProxyAPI без их поддержки):
+                    # такой ответ повторится, поэтому потоковый режим отключается до конца сессии.
+                    # Сетевые ошибки и лимиты попадают в общий обработчик ниже
+                    print(f"⚠️ Потоковый режим недоступен ({e}), отправляем обычный запрос")
+                    self.stream = False
             
-            # Извлекаем данные из ответа
-            result = {
-                "answer": response.choices[0].message.content,
-                "model": response.model,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                },
-                "finish_reason": response.choices[0].finish_reason
-            }
+            if stream is not None:
+                result = self._read_stream(stream)
+            else:
+                # Отправляем запрос
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens
+                )
+                
+                # Извлекаем данные из ответа
+                result = self._response_to_result(response)
             
+            self.cache.set(cache_key, result)
+            if embedding is not None:
+                self.cache.add_embedding(scope, cache_key, embedding)
+            result["streamed"] = stream is not None
             return result
             
         except Exception as e:
             print(f"\n❌ Ошибка при обращении к API: {e}")
             sys.exit(1)
     
-    def _build_system_message(self, prompt_data: Dict) -> str:
-        """Создает системное сообщение из данных промпта"""
-        parts = []
+    def send_requests(self, prompt_data: Dict, questions: List[str]) -> List:
+        """
+        Отправляет несколько независимых вопросов к OpenAI API одновременно
         
-        # Добавляем роль
-        if "role" in prompt_data:
-            parts.append(f"{prompt_data['role']}")
+        Args:
+            prompt_data: Данные промпта
+            questions: Список вопросов пользователя
         
-        # Добавляем контекст
-        if "context" in prompt_data:
-            parts.append(f"\nКОНТЕКСТ: {prompt_data['context']}")
+        Returns:
+            Список результатов в порядке вопросов; для неудачных запросов - исключение
+        """
+        return asyncio.run(self.send_batch(prompt_data, questions))
+    
+    async def send_batch(self, prompt_data: Dict, questions: List[str]) -> List:
+        """Асинхронно отправляет вопросы, ограничивая число одновременных запросов"""
+        system_message = self._get_system_message(prompt_data)
+        scope = self.cache.make_scope(self.model, self.temperature, self.max_tokens, system_message)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
         
-        # Добавляем описание структуры в текстовом формате
-        if "structure" in prompt_data:
-            parts.append(f"\nФОРМАТ ОТВЕТА:")
-            structure = prompt_data['structure']
-            
-            if 'output_format' in structure:
-                parts.append(f"Формат: {structure['output_format']}")
+        async with AsyncOpenAI(api_key=self.api_key, base_url=self.base_url) as aclient:
+            async def send_one(user_question: str) -> Dict:
+                cache_key = self.cache.make_key(scope, user_question)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+                
+                async with semaphore:
+                    response = await aclient.chat.completions.create(
+                        model=self.model,
+                        messages=[
+                            {"role": "system", "content": system_message},
+                            {"role": "user", "content": user_question}
+                        ],
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens
+                    )
+                
+                result = self._response_to_result(response)
+                self.cache.set(cache_key, result)
+                return result
             
-            if 'components' in structure:
-                parts.append("\nОтвет должен содержать следующие разделы:")
-                for component in structure['components']:
-                    name = component.get('name', '')
-                    desc = component.get('description', '')
-                    parts.append(f"- {name}: {desc}")
-        
-        # Добавляем требования к формату
-        if "format" in prompt_data:
-            format_info = prompt_data['format']
-            parts.append("\nТРЕБОВАНИЯ:")
+            print(f"\n🔄 Отправляем {len(questions)} запросов к OpenAI (одновременно до {self.max_concurrency})...")
+            return await asyncio.gather(
+                *(send_one(question) for question in questions),
+                return_exceptions=True
+            )
+    
+    def _embed(self, text: str) -> Optional[List[float]]:
+        """Возвращает нормализованный эмбеддинг текста или None при ошибке"""
+        try:
+            response = self.client.embeddings.create(model=EMBEDDING_MODEL, input=[text])
+        except Exception as e:
+            print(f"⚠️ Не удалось получить эмбеддинг вопроса: {e}")
+            return None
+        return self.cache.normalize(response.data[0].embedding)
+    
+    @staticmethod
+    def _response_to_result(response) -> Dict:
+        """Извлекает ответ и метаинформацию из ответа API"""
+        return {
+            "answer": response.choices[0].message.content,
+            "model": response.model,
+            "usage": {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens
+            },
+            "finish_reason": response.choices[0].finish_reason
+        }
+    
+    def _read_stream(self, stream) -> Dict:
+        """Выводит потоковый ответ в stdout и собирает итоговый результат"""
+        chunks = []
+        model = self.model
+        finish_reason = None
+        usage = None
+        last_flush = time.monotonic()
+        
+        print()
+        for chunk in stream:
+            model = chunk.model or model
+            # Статистика токенов приходит в последнем чанке без choices
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
             
-            if 'structure' in format_info:
-                parts.append(f"- {format_info['structure']}")
-            if 'length' in format_info:
-                parts.append(f"- {format_info['length']}")
-            if 'style' in format_info:
-                parts.append(f"- {format_info['style']}")
-            if 'requirements' in format_info:
-                for req in format_info['requirements']:
-                    parts.append(f"- {req}")
+            choice = chunk.choices[0]
+            text = choice.delta.content
+            if text:
+                chunks.append(text)
+                sys.stdout.write(text)
+                now = time.monotonic()
+                if now - last_flush >= STREAM_FLUSH_INTERVAL:
+                    sys.stdout.flush()
+                    last_flush = now
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+        
+        sys.stdout.write("\n")
+        sys.stdout.flush()
         
-        # Важная инструкция о формате
-        parts.append("\n⚠️ ВАЖНО: Отвечай в формате читаемого текста с использованием Markdown разметки (заголовки #, ##, списки -, **жирный текст**). НЕ используй JSON формат в ответе!")
+        return {
+            "answer": "".join(chunks),
+            "model": model,
+            "usage": {
+                "prompt_tokens": usage.prompt_tokens if usage else 0,
+                "completion_tokens": usage.completion_tokens if usage else 0,
+                "total_tokens": usage.total_tokens if usage else 0
+            },
+            "finish_reason": finish_reason
+        }
+    
+    def _get_system_message(self, prompt_data: Dict) -> str:
+        """
+        Возвращает системное сообщение промпта
         
-        return "\n".join(parts)
+        Сообщение собирается один раз при загрузке промпта (PromptsManager),
+        поэтому оно побайтово одинаково между запросами и провайдер может
+        переиспользовать закэшированный префикс промпта.
+        """
+        system_message = prompt_data.get('_system_message')
+        if system_message is None:
+            system_message = build_system_message(prompt_data)
+        return system_message
+
+
+def write_lines(lines: List[str]):
+    """Выводит набор строк одной операцией записи в stdout"""
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
 
 
 def get_user_input(prompt: str, default: str = "") -> str:
@@ -228,12 +733,14 @@ def get_multiline_input(prompt: str) -> str:
     Получает многострочный ввод от пользователя
     Ввод завершается словом END на отдельной строке или EOF (Ctrl+D на Mac/Linux, Ctrl+Z на Windows)
     """
-    print(f"\n{prompt}")
-    print("💡 Варианты ввода:")
-    print("   1. Вставьте текст, затем на новой строке напишите: END")
-    print("   2. Нажмите Ctrl+D (Mac/Linux) / Ctrl+Z (Windows) для завершения")
-    print("   3. Введите 'file:путь_к_файлу.txt' для чтения из файла")
-    print("-" * 80)
+    write_lines([
+        f"\n{prompt}",
+        "💡 Варианты ввода:",
+        "   1. Вставьте текст, затем на новой строке напишите: END",
+        "   2. Нажмите Ctrl+D (Mac/Linux) / Ctrl+Z (Windows) для завершения",
+        "   3. Введите 'file:путь_к_файлу.txt' для чтения из файла",
+        DIVIDER_LINE
+    ])
     
     lines = []
     first_line = True
@@ -241,25 +748,32 @@ def get_multiline_input(prompt: str) -> str:
     try:
         while True:
             try:
-                # Читаем с обработкой ошибок кодировки
+                # Читаем строку напрямую из буферизованного stdin, без накладных
+                # расходов input() на вывод приглашения и flush на каждую строку
                 try:
-                    line = input()
+                    line = sys.stdin.readline()
                 except UnicodeDecodeError:
                     # Если ошибка кодировки, пытаемся прочитать с заменой некорректных символов
-                    line = sys.stdin.buffer.readline().decode('utf-8', errors='replace').rstrip('\n\r')
+                    line = sys.stdin.buffer.readline().decode('utf-8', errors='replace')
                 
-                # Проверяем команду завершения
-                if line.strip().upper() == 'END':
+                # Пустая строка без перевода строки означает EOF
+                if not line:
+                    raise EOFError
+                line = line.rstrip('\n\r')
+                
+                # Проверяем команду завершения; длинные строки не могут быть
+                # маркером END, поэтому strip/upper для них не выполняются
+                if len(line) <= END_MARKER_MAX_LEN and line.strip().upper() == 'END':
                     break
                 
                 # Проверяем, не команда ли это для чтения из файла
                 if first_line and line.strip().startswith('file:'):
                     file_path = line.strip()[5:].strip()
                     try:
-                        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                            content = f.read()
+                        # Файл читается как bytes одним вызовом и декодируется один раз
+                        content = Path(file_path).read_bytes().decode('utf-8', errors='replace')
                         print(f"✅ Прочитано из файла: {len(content)} символов")
-                        print("-" * 80)
+                        print(DIVIDER_LINE)
                         return content.strip()
                     except FileNotFoundError:
                         print(f"❌ Файл не найден: {file_path}")
@@ -277,8 +791,8 @@ def get_multiline_input(prompt: str) -> str:
                 # Добавляем строку (даже пустую)
                 lines.append(line)
                 
-                # Показываем прогресс каждые 10 строк
-                if len(lines) % 10 == 0:
+                # Показываем прогресс каждые PROGRESS_EVERY строк
+                if len(lines) % PROGRESS_EVERY == 0:
                     print(f"  [Введено строк: {len(lines)}]", end='\r')
                     
             except EOFError:
@@ -297,7 +811,7 @@ def get_multiline_input(prompt: str) -> str:
     if lines:
         print(f"\n✅ Введено строк: {len(lines)}, символов: {len(result)}")
     
-    print("-" * 80)
+    print(DIVIDER_LINE)
     
     # Дополнительная очистка некорректных символов
     result = result.replace('�', ' ')  # Заменяем символы замены на пробел
@@ -316,13 +830,15 @@ def yes_no_question(question: str, default: str = "n") -> bool:
 
 def show_summary_submenu() -> str:
     """Показывает подменю для промпта 'Резюме текста'"""
-    print("\n" + "="*80)
-    print("📋 ПОДМЕНЮ: Резюме текста")
-    print("="*80)
-    print("\n1. Стандартные запросы (резюмирование)")
-    print("2. Генерация текстового поста (LangChain)")
-    print("0. Назад к выбору промпта")
-    print()
+    write_lines([
+        "\n" + SEPARATOR_LINE,
+        "📋 ПОДМЕНЮ: Резюме текста",
+        SEPARATOR_LINE,
+        "\n1. Стандартные запросы (резюмирование)",
+        "2. Генерация текстового поста (LangChain)",
+        "0. Назад к выбору промпта",
+        ""
+    ])
     
     while True:
         choice = input("Выберите опцию (1-2, 0 для выхода): ").strip()
@@ -335,13 +851,15 @@ def show_summary_submenu() -> str:
 
 def show_code_structure_submenu() -> str:
     """Показывает подменю для промпта 'Генерация структуры кода'"""
-    print("\n" + "="*80)
-    print("📋 ПОДМЕНЮ: Генерация структуры кода")
-    print("="*80)
-    print("\n1. Стандартные запросы")
-    print("2. Генерация Telegram бота (LangChain)")
-    print("0. Назад к выбору промпта")
-    print()
+    write_lines([
+        "\n" + SEPARATOR_LINE,
+        "📋 ПОДМЕНЮ: Генерация структуры кода",
+        SEPARATOR_LINE,
+        "\n1. Стандартные запросы",
+        "2. Генерация Telegram бота (LangChain)",
+        "0. Назад к выбору промпта",
+        ""
+    ])
     
     while True:
         choice = input("Выберите опцию (1-2, 0 для выхода): ").strip()
@@ -354,12 +872,14 @@ def show_code_structure_submenu() -> str:
 
 def generate_text_post():
     """Запускает генератор текстовых постов"""
-    print("\n" + "="*80)
-    print("📝 ГЕНЕРАТОР ТЕКСТОВЫХ ПОСТОВ")
-    print("="*80)
-    print("\nС помощью LangChain будет создан готовый пост на основе вашей темы.")
-    print("Цепочка обработки: Анализ → Подбор стиля → Структура → Генерация")
-    print()
+    write_lines([
+        "\n" + SEPARATOR_LINE,
+        "📝 ГЕНЕРАТОР ТЕКСТОВЫХ ПОСТОВ",
+        SEPARATOR_LINE,
+        "\nС помощью LangChain будет создан готовый пост на основе вашей темы.",
+        "Цепочка обработки: Анализ → Подбор стиля → Структура → Генерация",
+        ""
+    ])
     
     # Получаем тему поста
     topic = get_multiline_input("💬 Введите тему поста:")
@@ -382,7 +902,7 @@ def generate_text_post():
         return
     
     print("\n⏳ Запускаем генератор постов...")
-    print("-" * 80)
+    print(DIVIDER_LINE)
     
     try:
         # Запускаем script_post.py с темой и текстом
@@ -398,9 +918,9 @@ def generate_text_post():
         )
         
         if result.returncode == 0:
-            print("\n" + "="*80)
+            print("\n" + SEPARATOR_LINE)
             print("✅ Пост успешно сгенерирован!")
-            print("="*80)
+            print(SEPARATOR_LINE)
         else:
             print(f"\n❌ Ошибка при генерации поста (код: {result.returncode})")
             
@@ -410,14 +930,30 @@ def generate_text_post():
     input("\n\nНажмите Enter для продолжения...")
 
 
+def run_bot_generator(description: str) -> int:
+    """
+    Запускает генератор ботов в текущем процессе
+    
+    Импорт модуля вместо запуска нового интерпретатора избавляет от повторной
+    инициализации Python и загрузки LangChain при каждой генерации.
+    """
+    bot_module = importlib.import_module("script_bot")
+    try:
+        return bot_module.main(description)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+
+
 def generate_telegram_bot():
     """Запускает генератор Telegram бота"""
-    print("\n" + "="*80)
-    print("🤖 ГЕНЕРАТОР TELEGRAM БОТОВ")
-    print("="*80)
-    print("\nС помощью LangChain будет создан готовый Telegram бот на основе вашего описания.")
-    print("Цепочка обработки: Анализ → Генерация кода → Проверка кода")
-    print()
+    write_lines([
+        "\n" + SEPARATOR_LINE,
+        "🤖 ГЕНЕРАТОР TELEGRAM БОТОВ",
+        SEPARATOR_LINE,
+        "\nС помощью LangChain будет создан готовый Telegram бот на основе вашего описания.",
+        "Цепочка обработки: Анализ → Генерация кода → Проверка кода",
+        ""
+    ])
     
     # Получаем описание бота
     description = get_multiline_input("💬 Введите описание бота (что он должен уметь):")
@@ -433,34 +969,45 @@ def generate_telegram_bot():
         return
     
     print("\n⏳ Запускаем генератор бота...")
-    print("-" * 80)
+    print(DIVIDER_LINE)
+    
+    if os.getenv("CP_EXEC_BOT") == "1":
+        # Процесс CLI заменяется генератором бота: второй интерпретатор
+        # не держится в памяти, но вернуться в меню после генерации нельзя
+        sys.stdout.flush()
+        os.execvp(sys.executable, [sys.executable, "script_bot.py", description])
     
     try:
-        # Запускаем script_bot.py с описанием
-        result = subprocess.run(
-            [sys.executable, "script_bot.py", description],
-            capture_output=False,
-            text=True,
-            encoding='utf-8'
-        )
+        if os.getenv("ISOLATE_BOT") == "1":
+            # Запускаем script_bot.py с описанием в отдельном процессе
+            result = subprocess.run(
+                [sys.executable, "script_bot.py", description],
+                capture_output=False,
+                text=True,
+                encoding='utf-8'
+            )
+            returncode = result.returncode
+        else:
+            returncode = run_bot_generator(description)
         
-        if result.returncode == 0:
-            print("\n" + "="*80)
+        if returncode == 0:
+            print("\n" + SEPARATOR_LINE)
             print("✅ Бот успешно сгенерирован!")
-            print("="*80)
+            print(SEPARATOR_LINE)
             
             # Спрашиваем, показать ли содержимое
             if yes_no_question("Показать сгенерированный код?", "n"):
                 bot_file = Path("generated_bot.py")
                 if bot_file.exists():
-                    print("\n" + "="*80)
-                    print("📄 СОДЕРЖИМОЕ: generated_bot.py")
-                    print("="*80)
-                    with open(bot_file, 'r', encoding='utf-8') as f:
-                        print(f.read())
-                    print("="*80)
+                    write_lines([
+                        "\n" + SEPARATOR_LINE,
+                        "📄 СОДЕРЖИМОЕ: generated_bot.py",
+                        SEPARATOR_LINE,
+                        bot_file.read_text(encoding='utf-8'),
+                        SEPARATOR_LINE
+                    ])
         else:
-            print(f"\n❌ Ошибка при генерации бота (код: {result.returncode})")
+            print(f"\n❌ Ошибка при генерации бота (код: {returncode})")
             
     except Exception as e:
         print(f"\n❌ Ошибка при запуске генератора: {e}")
@@ -470,38 +1017,76 @@ def generate_telegram_bot():
 
 def print_header():
     """Выводит заголовок программы"""
-    print("\n" + "="*80)
-    print("🤖 CLI Инструмент для работы с промптами и OpenAI API")
-    print("="*80)
+    write_lines([
+        "\n" + SEPARATOR_LINE,
+        "🤖 CLI Инструмент для работы с промптами и OpenAI API",
+        SEPARATOR_LINE
+    ])
+
+
+def split_questions(text: str) -> List[str]:
+    """Разбивает ввод на отдельные вопросы по строкам-разделителям"""
+    questions = []
+    current = []
+    for line in text.split("\n"):
+        if line.strip() == QUESTION_SEPARATOR:
+            questions.append("\n".join(current).strip())
+            current = []
+        else:
+            current.append(line)
+    questions.append("\n".join(current).strip())
+    return [question for question in questions if question]
+
+
+def print_batch_answer(idx: int, question: str, response_data):
+    """Выводит ответ на один из вопросов пакета"""
+    short_question = question if len(question) <= 60 else question[:60] + "..."
+    lines = [
+        "\n" + SEPARATOR_LINE,
+        f"💡 Ответ на вопрос {idx}: {short_question}",
+        SEPARATOR_LINE,
+        ""
+    ]
+    if isinstance(response_data, Exception):
+        lines.append(f"❌ Ошибка при обращении к API: {response_data}")
+        write_lines(lines + ["", SEPARATOR_LINE])
+        return
+    
+    lines.append(response_data.get("answer") or "Нет ответа")
+    write_lines(lines + ["", SEPARATOR_LINE])
+    print_response_info(response_data)
 
 
 def print_request_info(model: str, temperature: float, max_tokens: int):
     """Выводит информацию о настройках запроса"""
-    print("\n" + "="*80)
-    print("📊 Информация о запросе:")
-    print(f"  • Модель: {model}")
-    print(f"  • Temperature: {temperature}")
-    print(f"  • Max tokens: {max_tokens}")
-    print("="*80)
+    write_lines([
+        "\n" + SEPARATOR_LINE,
+        "📊 Информация о запросе:",
+        f"  • Модель: {model}",
+        f"  • Temperature: {temperature}",
+        f"  • Max tokens: {max_tokens}",
+        SEPARATOR_LINE
+    ])
 
 
 def print_response_info(response_data: Dict):
     """Выводит информацию об ответе"""
     usage = response_data.get("usage", {})
     
-    print("\n" + "="*80)
-    print("📊 Информация о запросе:")
-    print(f"  • Модель: {response_data.get('model', 'N/A')}")
-    print(f"  • Использовано токенов: {usage.get('total_tokens', 0)}")
-    print(f"  • Промпт токены: {usage.get('prompt_tokens', 0)}")
-    print(f"  • Ответ токены: {usage.get('completion_tokens', 0)}")
-    print("="*80)
-    print("\n👍 Готово! До свидания!")
+    write_lines([
+        "\n" + SEPARATOR_LINE,
+        "📊 Информация о запросе:",
+        f"  • Модель: {response_data.get('model', 'N/A')}",
+        f"  • Использовано токенов: {usage.get('total_tokens', 0)}",
+        f"  • Промпт токены: {usage.get('prompt_tokens', 0)}",
+        f"  • Ответ токены: {usage.get('completion_tokens', 0)}",
+        SEPARATOR_LINE
+    ])
 
 
 def configure_model(client: OpenAIClient) -> tuple:
     """Позволяет настроить параметры модели"""
-    print("\n" + "="*80)
+    print("\n" + SEPARATOR_LINE)
     print("⚙️ Настройки модели:")
     
     # Temperature
@@ -528,7 +1113,7 @@ def configure_model(client: OpenAIClient) -> tuple:
     if model_input:
         client.model = model_input
     
-    print("="*80)
+    print(SEPARATOR_LINE)
     
     return client.model, client.temperature, client.max_tokens
 
@@ -605,12 +1190,12 @@ def main():
             print("⚠️ Введите число или 'выход'")
     
     # Показываем ПОЛНЫЙ тестовый вопрос
-    print("\n" + "="*80)
+    print("\n" + SEPARATOR_LINE)
     test_input = selected_prompt.get('test_input', '')
     if test_input:
         print(f"💡 Доступен тестовый вопрос:")
         print(f"   {test_input}")
-    print("="*80)
+    print(SEPARATOR_LINE)
     
     # Спрашиваем про тестовый вопрос
     if test_input:
@@ -624,30 +1209,56 @@ def main():
     # Сообщение о начале работы
     print(f"\n⏳ Отправляем запрос к OpenAI...")
     
-    # Получаем вопрос
-    if use_test_question and test_input:
-        user_question = test_input
-        print(f"\n✅ Используем тестовый вопрос")
-    else:
-        user_question = get_multiline_input("💬 Введите ваш вопрос:")
-        if not user_question:
-            print("❌ Вопрос не может быть пустым!")
-            sys.exit(1)
-    
-    # Отправляем запрос
-    response_data = client.send_request(selected_prompt, user_question)
-    
-    # Выводим ответ
-    print("\n" + "="*80)
-    print(f"💡 Ответ от OpenAI - {selected_prompt.get('name')}")
-    print("="*80)
-    print()
-    print(response_data.get("answer", "Нет ответа"))
-    print()
-    print("="*80)
+    # Сессия вопросов: клиент и его HTTP-соединение переиспользуются между запросами
+    while True:
+        # Получаем вопрос
+        if use_test_question and test_input:
+            user_question = test_input
+            use_test_question = False
+            print(f"\n✅ Используем тестовый вопрос")
+        else:
+            print(f"\n💡 Несколько независимых вопросов можно разделить строкой {QUESTION_SEPARATOR}")
+            user_question = get_multiline_input("💬 Введите ваш вопрос:")
+            if not user_question:
+                # Пустой ввод завершает сессию, а не всю программу с ошибкой
+                print("❌ Вопрос не введен, сессия завершена")
+                break
+        
+        # Несколько вопросов отправляются одновременно
+        questions = split_questions(user_question)
+        if len(questions) > 1:
+            responses = client.send_requests(selected_prompt, questions)
+            for idx, (question, response_data) in enumerate(zip(questions, responses), 1):
+                print_batch_answer(idx, question, response_data)
+            
+            if not yes_no_question("Задать ещё вопрос?", "y"):
+                break
+            continue
+        
+        # Заголовок ответа выводится до запроса: в потоковом режиме
+        # текст ответа печатается по мере генерации внутри send_request
+        write_lines([
+            "\n" + SEPARATOR_LINE,
+            f"💡 Ответ от OpenAI - {selected_prompt.get('name')}",
+            SEPARATOR_LINE
+        ])
+        
+        # Отправляем запрос
+        response_data = client.send_request(selected_prompt, user_question)
+        
+        # Выводим ответ
+        lines = []
+        if not response_data.get("streamed"):
+            lines += ["", response_data.get("answer") or "Нет ответа"]
+        write_lines(lines + ["", SEPARATOR_LINE])
+        
+        # Выводим статистику
+        print_response_info(response_data)
+        
+        if not yes_no_question("Задать ещё вопрос?", "y"):
+            break
     
-    # Выводим статистику
-    print_response_info(response_data)
+    print("\n👍 Готово! До свидания!")
 
 
 if __name__ == "__main__":
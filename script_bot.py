@@ -5,17 +5,359 @@
 
 import os
 import sys
+import ast
+import json
+import contextlib
+import asyncio
 import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional, Tuple
+import httpx
 from dotenv import load_dotenv
+from openai import APIConnectionError, InternalServerError, RateLimitError
 from langchain_openai import ChatOpenAI
+from langchain_core.globals import set_llm_cache
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.output_parsers.json import SimpleJsonOutputParser
+from pydantic import BaseModel
+
+# orjson (опционально) сериализует JSON в несколько раз быстрее
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Пул соединений, общий для всех цепочек одного запуска
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+# Кэш ответов LLM: повторная генерация по тому же описанию не тратит токены
+LLM_CACHE_PATH = ".langchain_bot_cache.db"
+
+# Результаты цепочек в пределах процесса: повторный вызов с теми же входными данными бесплатен
+MEMO_MAX_SIZE = 128
+_memo: Dict[bytes, Dict[str, Any]] = {}
+
+# JSON-цепочки решают задачи анализа и классификации, а не творческие:
+# нулевая температура делает их ответы стабильными и пригодными для кэширования.
+# Температура из OPENAI_TEMPERATURE применяется только к генерации кода
+STRUCTURED_TEMPERATURE = 0.0
+
+# Временные ошибки API, при которых вызов цепочки повторяется с экспоненциальной задержкой,
+# а не заменяется значениями по умолчанию (APITimeoutError - подкласс APIConnectionError)
+RETRY_EXCEPTIONS = (RateLimitError, APIConnectionError, InternalServerError)
+RETRY_ATTEMPTS = 3
+
+# Максимальное число ботов, генерируемых одновременно в режиме --batch
+BATCH_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+
+# Поля плана, передаваемые в code_chain, обрезаются до этой длины, а пустые отбрасываются
+MAX_FIELD_LEN = 300
+EMPTY_VALUES = {"", "none", "n/a", "нет"}
+
+# Статические инструкции цепочек. Они стоят в начале каждого промпта, а данные
+# конкретного запроса - в конце (раздел ВХОДНЫЕ ДАННЫЕ): так префикс запроса
+# совпадает между вызовами и провайдер может переиспользовать его из кэша
+ANALYSIS_INSTRUCTIONS = """Ты — бизнес-аналитик и эксперт по Telegram ботам.
+
+Проанализируй техническое задание для Telegram бота (приведено в разделе ВХОДНЫЕ ДАННЫЕ).
+
+Выполни детальный анализ и определи:
+1. Основное назначение бота (главная цель)
+2. Ключевые функции, которые должен реализовать бот
+3. Типы взаимодействия с пользователем (команды, кнопки, текст, медиа)
+4. Уровень сложности реализации (simple - простой бот с базовыми командами, medium - бот с логикой и состояниями, complex - сложная логика с БД и API)
+5. Особые требования (производительность, безопасность, интеграции и т.д.)
+
+ВАЖНО: Отвечай строго в формате JSON со следующими полями:
+{{
+  "bot_purpose": "...",
+  "key_features": "...",
+  "user_interactions": "...",
+  "complexity_level": "simple|medium|complex",
+  "special_requirements": "..."
+}}"""
+
+TOOLS_INSTRUCTIONS = """Ты — архитектор решений для Telegram ботов.
+
+На основе исходного задания и результатов анализа (приведены в разделе ВХОДНЫЕ ДАННЫЕ) подбери оптимальный набор инструментов:
+1. Версия aiogram (3.x - современная, используй её)
+2. База данных (sqlite - для простых, postgresql - для сложных, none - если не нужна)
+3. Дополнительные библиотеки (requests для API, pillow для изображений и т.д.)
+4. Необходимые API интеграции (если требуется работа с внешними сервисами)
+5. Middleware компоненты (логирование, аналитика, антиспам и т.д.)
+6. Способ управления состояниями (FSM для диалогов, memory для простого хранения, none если не нужно)
+
+ВАЖНО: Отвечай строго в формате JSON со следующими полями:
+{{
+  "framework_version": "...",
+  "database": "sqlite|postgresql|none",
+  "additional_libraries": "...",
+  "api_integrations": "...",
+  "middleware_needs": "...",
+  "state_management": "FSM|memory|none"
+}}"""
+
+STRUCTURE_INSTRUCTIONS = """Ты — senior Python разработчик, специалист по архитектуре Telegram ботов.
+
+По исходному заданию, анализу и выбранным инструментам (приведены в разделе ВХОДНЫЕ ДАННЫЕ) спроектируй детальную структуру кода:
+1. Команды - список всех команд бота (/start, /help и т.д.)
+2. Handlers - обработчики (command_handler, message_handler, callback_handler и т.д.)
+3. States - состояния FSM если используется диалоговая логика
+4. Keyboards - какие клавиатуры нужны (reply для обычных, inline для кнопок под сообщениями)
+5. Modules - структура файлов (handlers.py, keyboards.py, database.py и т.д.)
+6. Data models - модели данных (классы для пользователей, записей и т.д.)
+7. Helper functions - вспомогательные функции (валидация, форматирование и т.д.)
+
+ВАЖНО: Отвечай строго в формате JSON со следующими полями:
+{{
+  "commands": "...",
+  "handlers": "...",
+  "states": "...",
+  "keyboards": "...",
+  "modules": "...",
+  "data_models": "...",
+  "helper_functions": "..."
+}}"""
+
+PLAN_INSTRUCTIONS = """Ты — бизнес-аналитик, архитектор решений и senior Python разработчик, специалист по Telegram ботам.
+
+По техническому заданию (приведено в разделе ВХОДНЫЕ ДАННЫЕ) за один проход подготовь план бота из трех разделов.
+
+Раздел "analysis" - анализ задания:
+1. Основное назначение бота (главная цель)
+2. Ключевые функции, которые должен реализовать бот
+3. Типы взаимодействия с пользователем (команды, кнопки, текст, медиа)
+4. Уровень сложности реализации (simple - простой бот с базовыми командами, medium - бот с логикой и состояниями, complex - сложная логика с БД и API)
+5. Особые требования (производительность, безопасность, интеграции и т.д.)
+
+Раздел "tools" - набор инструментов на основе анализа:
+1. Версия aiogram (3.x - современная, используй её)
+2. База данных (sqlite - для простых, postgresql - для сложных, none - если не нужна)
+3. Дополнительные библиотеки (requests для API, pillow для изображений и т.д.)
+4. Необходимые API интеграции (если требуется работа с внешними сервисами)
+5. Middleware компоненты (логирование, аналитика, антиспам и т.д.)
+6. Способ управления состояниями (FSM для диалогов, memory для простого хранения, none если не нужно)
+
+Раздел "structure" - детальная структура кода с учетом анализа и инструментов:
+1. Команды - список всех команд бота (/start, /help и т.д.)
+2. Handlers - обработчики (command_handler, message_handler, callback_handler и т.д.)
+3. States - состояния FSM если используется диалоговая логика
+4. Keyboards - какие клавиатуры нужны (reply для обычных, inline для кнопок под сообщениями)
+5. Modules - структура файлов (handlers.py, keyboards.py, database.py и т.д.)
+6. Data models - модели данных (классы для пользователей, записей и т.д.)
+7. Helper functions - вспомогательные функции (валидация, форматирование и т.д.)
+
+ВАЖНО: Отвечай строго в формате JSON со следующими полями:
+{{
+  "analysis": {{
+    "bot_purpose": "...",
+    "key_features": "...",
+    "user_interactions": "...",
+    "complexity_level": "simple|medium|complex",
+    "special_requirements": "..."
+  }},
+  "tools": {{
+    "framework_version": "...",
+    "database": "sqlite|postgresql|none",
+    "additional_libraries": "...",
+    "api_integrations": "...",
+    "middleware_needs": "...",
+    "state_management": "FSM|memory|none"
+  }},
+  "structure": {{
+    "commands": "...",
+    "handlers": "...",
+    "states": "...",
+    "keyboards": "...",
+    "modules": "...",
+    "data_models": "...",
+    "helper_functions": "..."
+  }}
+}}"""
+
+CODE_INSTRUCTIONS = """Ты — expert Python разработчик, специализирующийся на Telegram ботах с aiogram 3.x.
+
+Сгенерируй ПОЛНЫЙ рабочий код Telegram бота на Python по исходному заданию, анализу, инструментам и структуре кода (приведены в разделе ВХОДНЫЕ ДАННЫЕ).
+
+КРИТИЧЕСКИ ВАЖНЫЕ требования:
+1. Использовать ТОЛЬКО aiogram 3.x (не 2.x!)
+2. Все handlers ОБЯЗАТЕЛЬНО async def
+3. Токен бота читается из os.getenv("BOT_TOKEN")
+4. Используй современный синтаксис: Router, Dispatcher
+5. Импорты: from aiogram import Bot, Dispatcher, Router, F
+6. Для запуска: await dp.start_polling(bot)
+7. Добавь logging (import logging, logging.basicConfig)
+8. Обработка ошибок try/except где необходимо
+9. Если нужны состояния - используй FSM из aiogram.fsm
+10. Если нужны клавиатуры - используй ReplyKeyboardMarkup или InlineKeyboardMarkup
+11. Код ПОЛНОСТЬЮ готов к запуску, БЕЗ заглушек, TODO или комментариев "добавьте свой код"
+12. Все функции РЕАЛИЗОВАНЫ полностью
+
+Верни ТОЛЬКО код Python, без объяснений и без markdown форматирования."""
+
+REVIEW_INSTRUCTIONS = """Ты — опытный код-ревьюер Python кода.
+
+Проверь код Telegram бота (приведен в разделе ВХОДНЫЕ ДАННЫЕ):
+1. Синтаксические ошибки
+2. Корректность структуры запуска бота
+3. Правильность импортов (aiogram 3.x)
+4. Наличие обработки ошибок
+5. Общее качество кода
+
+ВАЖНО: Отвечай строго в формате JSON со следующими полями:
+{{
+  "is_valid": "yes|no",
+  "syntax_errors": "...",
+  "structure_issues": "...",
+  "import_issues": "...",
+  "recommendations": "..."
+}}"""
+
+
+# Шаблоны собираются один раз при загрузке модуля; LLM подключается в цепочках,
+# так как клиент создается на каждый запуск генерации
+ANALYSIS_PROMPT = ChatPromptTemplate.from_template(
+    ANALYSIS_INSTRUCTIONS + """
+
+ВХОДНЫЕ ДАННЫЕ:
+Техническое задание: {description}"""
+)
+
+TOOLS_PROMPT = ChatPromptTemplate.from_template(
+    TOOLS_INSTRUCTIONS + """
+
+ВХОДНЫЕ ДАННЫЕ:
+Исходное задание: {description}
+
+Результаты анализа:
+- Назначение: {bot_purpose}
+- Ключевые функции: {key_features}
+- Взаимодействия: {user_interactions}
+- Сложность: {complexity_level}
+- Требования: {special_requirements}"""
+)
+
+STRUCTURE_PROMPT = ChatPromptTemplate.from_template(
+    STRUCTURE_INSTRUCTIONS + """
+
+ВХОДНЫЕ ДАННЫЕ:
+Исходное задание: {description}
+
+Анализ:
+- Назначение: {bot_purpose}
+- Функции: {key_features}
+- Сложность: {complexity_level}
+
+Инструменты:
+- Framework: {framework_version}
+- БД: {database}
+- Библиотеки: {additional_libraries}
+- Состояния: {state_management}"""
+)
+
+PLAN_PROMPT = ChatPromptTemplate.from_template(
+    PLAN_INSTRUCTIONS + """
+
+ВХОДНЫЕ ДАННЫЕ:
+Техническое задание: {description}"""
+)
+
+CODE_PROMPT = ChatPromptTemplate.from_template(
+    CODE_INSTRUCTIONS + """
+
+ВХОДНЫЕ ДАННЫЕ:
+Исходное задание: {description}
+
+АНАЛИЗ:
+- Назначение: {bot_purpose}
+- Функции: {key_features}
+- Сложность: {complexity_level}
+
+ИНСТРУМЕНТЫ:
+- Framework: {framework_version}
+- База данных: {database}
+- Библиотеки: {additional_libraries}
+- Управление состояниями: {state_management}
+
+СТРУКТУРА КОДА:
+- Команды: {commands}
+- Обработчики: {handlers}
+- Состояния FSM: {states}
+- Клавиатуры: {keyboards}
+- Модули: {modules}
+- Модели данных: {data_models}
+- Вспомогательные функции: {helper_functions}"""
+)
+
+REVIEW_PROMPT = ChatPromptTemplate.from_template(
+    REVIEW_INSTRUCTIONS + """
+
+ВХОДНЫЕ ДАННЫЕ:
+```python
+{code}
+```"""
+)
+
+class AnalysisOut(BaseModel):
+    """Результат анализа задания"""
+    bot_purpose: str
+    key_features: str
+    user_interactions: str
+    complexity_level: Literal["simple", "medium", "complex"]
+    special_requirements: str
+
+
+class ToolsOut(BaseModel):
+    """Подобранные инструменты"""
+    framework_version: str
+    database: Literal["sqlite", "postgresql", "none"]
+    additional_libraries: str
+    api_integrations: str
+    middleware_needs: str
+    state_management: Literal["FSM", "memory", "none"]
+
+
+class StructureOut(BaseModel):
+    """Структура кода бота"""
+    commands: str
+    handlers: str
+    states: str
+    keyboards: str
+    modules: str
+    data_models: str
+    helper_functions: str
+
+
+class PlanOut(BaseModel):
+    """План бота: анализ, инструменты и структура"""
+    analysis: AnalysisOut
+    tools: ToolsOut
+    structure: StructureOut
+
+
+class ReviewOut(BaseModel):
+    """Результат проверки кода"""
+    is_valid: Literal["yes", "no"]
+    syntax_errors: str
+    structure_issues: str
+    import_issues: str
+    recommendations: str
+
+
+def json_key(obj: Any) -> bytes:
+    """Каноничный JSON (с сортировкой ключей) для ключей кэшей, через orjson, если он установлен"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False).encode('utf-8')
+
 
 def setup_logger() -> None:
     """Настройка логирования"""
@@ -27,70 +369,140 @@ def setup_logger() -> None:
     )
 
 
-def create_llm():
-    """Создает экземпляр LLM"""
-    api_key = os.getenv("OPENAI_API_KEY")
-    base_url = os.getenv("OPENAI_BASE_URL")
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    
-    if not api_key:
-        logger.error("OPENAI_API_KEY не найден в .env файле!")
-        print("❌ OPENAI_API_KEY не найден в .env файле!")
-        sys.exit(1)
-    
+def setup_llm_cache() -> None:
+    """Включает SQLite-кэш ответов LLM (LLM_CACHE=0 отключает)"""
+    if os.getenv("LLM_CACHE", "1") != "1":
+        return
+    try:
+        from langchain_community.cache import SQLiteCache
+    except ImportError:
+        logger.warning("langchain-community не установлен, кэш ответов LLM отключен")
+        return
+    set_llm_cache(SQLiteCache(database_path=LLM_CACHE_PATH))
+    logger.debug("Кэш ответов LLM: %s", LLM_CACHE_PATH)
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Возвращает общий асинхронный HTTP клиент (создается при первом обращении)"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(limits=HTTP_LIMITS)
+    return _http_client
+
+
+@lru_cache(maxsize=4)
+def _build_llm(api_key: str, base_url: Optional[str], model: str, temperature: float) -> ChatOpenAI:
+    """Создает LLM один раз на набор параметров, чтобы цепочки делили пул соединений"""
     kwargs = {
         "api_key": api_key,
         "model": model,
-        "temperature": 0.7
+        "temperature": temperature,
+        "http_async_client": _get_http_client(),
     }
     
-    if base_url and base_url.strip():
+    if base_url:
         kwargs["base_url"] = base_url
-        logger.debug(f"Используется ProxyAPI: {base_url}")
+        logger.debug("Используется ProxyAPI: %s", base_url)
     
-    logger.debug(f"Создан LLM клиент: model={model}, temperature=0.7")
+    logger.debug("Создан LLM клиент: model=%s, temperature=%s", model, temperature)
     return ChatOpenAI(**kwargs)
 
 
-def analysis_chain(description: str) -> dict:
+def role_model(role: str) -> str:
     """
-    Цепочка 1: Анализ задания бота
+    Возвращает модель для роли цепочки
+    
+    Args:
+        role: "fast" - JSON-цепочки (OPENAI_MODEL_FAST), "code" - генерация кода (OPENAI_MODEL_CODE, иначе OPENAI_MODEL)
     """
-    logger.info("Запуск analysis_chain")
-    logger.debug(f"Описание: {description[:100]}...")
-    llm = create_llm()
+    if role == "fast":
+        return os.getenv("OPENAI_MODEL_FAST", "gpt-4o-mini")
+    return os.getenv("OPENAI_MODEL_CODE") or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+
+def create_llm(role: str = "code"):
+    """
+    Создает экземпляр LLM
+    
+    Args:
+        role: "fast" - быстрая модель с нулевой температурой для JSON-цепочек,
+              "code" - модель для генерации кода с температурой из OPENAI_TEMPERATURE
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    base_url = os.getenv("OPENAI_BASE_URL")
+    model = role_model(role)
+    if role == "fast":
+        temperature = STRUCTURED_TEMPERATURE
+    else:
+        temperature = float(os.getenv("OPENAI_TEMPERATURE", "0.7"))
+    
+    if not api_key:
+        logger.error("OPENAI_API_KEY не найден в .env файле!")
+        print("❌ OPENAI_API_KEY не найден в .env файле!")
+        sys.exit(1)
+    
+    if base_url:
+        base_url = base_url.strip() or None
     
-    prompt = ChatPromptTemplate.from_template(
-        """Ты — бизнес-аналитик и эксперт по Telegram ботам.
+    return _build_llm(api_key, base_url, model, temperature)
 
-Проанализируй следующее техническое задание для Telegram бота:
-{description}
 
-Выполни детальный анализ и определи:
-1. Основное назначение бота (главная цель)
-2. Ключевые функции, которые должен реализовать бот
-3. Типы взаимодействия с пользователем (команды, кнопки, текст, медиа)
-4. Уровень сложности реализации (simple - простой бот с базовыми командами, medium - бот с логикой и состояниями, complex - сложная логика с БД и API)
-5. Особые требования (производительность, безопасность, интеграции и т.д.)
+async def close_llm() -> None:
+    """
+    Закрывает общий HTTP клиент и сбрасывает кэш LLM.
+    
+    Клиент привязан к циклу событий, а asyncio.run создает новый цикл
+    на каждый вызов main(), поэтому соединения живут в пределах одного запуска.
+    """
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    _build_llm.cache_clear()
 
-ВАЖНО: Отвечай строго в формате JSON со следующими полями:
-{{
-  "bot_purpose": "...",
-  "key_features": "...",
-  "user_interactions": "...",
-  "complexity_level": "simple|medium|complex",
-  "special_requirements": "..."
-}}"""
+
+def with_retry(runnable):
+    """Оборачивает LLM повторами при временных ошибках API; ошибки разбора ответа не повторяются"""
+    return runnable.with_retry(
+        retry_if_exception_type=RETRY_EXCEPTIONS,
+        wait_exponential_jitter=True,
+        stop_after_attempt=RETRY_ATTEMPTS,
     )
+
+
+async def _memo_invoke(chain_name: str, chain, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Вызывает цепочку со структурированным выводом, запоминая результат по имени цепочки и входным данным
+    
+    lru_cache здесь не подходит: он кэшировал бы одноразовую корутину, а не результат
+    """
+    key = chain_name.encode('utf-8') + b":" + json_key(inputs)
+    if key in _memo:
+        logger.debug("%s: результат взят из памяти", chain_name)
+        return _memo[key]
+    result = (await chain.ainvoke(inputs)).model_dump()
+    _memo[key] = result
+    if len(_memo) > MEMO_MAX_SIZE:
+        del _memo[next(iter(_memo))]
+    return result
+
+
+async def analysis_chain(description: str) -> dict:
+    """
+    Цепочка 1: Анализ задания бота
+    """
+    logger.info("Запуск analysis_chain")
+    logger.debug("Описание: %.100s...", description)
+    llm = create_llm("fast")
     
-    chain = prompt | llm | SimpleJsonOutputParser()
+    chain = ANALYSIS_PROMPT | with_retry(llm.with_structured_output(AnalysisOut))
     
     try:
-        result = chain.invoke({"description": description})
-        logger.info(f"Analysis chain завершен: complexity={result.get('complexity_level', 'N/A')}")
+        result = await _memo_invoke("analysis_chain", chain, {"description": description})
+        logger.info("Analysis chain завершен: complexity=%s", result.get('complexity_level', 'N/A'))
         return result
     except Exception as e:
-        logger.warning(f"Ошибка парсинга в analysis_chain: {e}. Используются значения по умолчанию")
+        logger.warning("Ошибка парсинга в analysis_chain: %s. Используются значения по умолчанию", e)
         return {
             "bot_purpose": "Базовый функционал",
             "key_features": "Обработка команд",
@@ -100,48 +512,17 @@ def analysis_chain(description: str) -> dict:
         }
 
 
-def tools_selection_chain(analysis: dict, description: str) -> dict:
+async def tools_selection_chain(analysis: dict, description: str) -> dict:
     """
     Цепочка 2: Подбор инструментов для генерации
     """
     logger.info("Запуск tools_selection_chain")
-    llm = create_llm()
+    llm = create_llm("fast")
     
-    prompt = ChatPromptTemplate.from_template(
-        """Ты — архитектор решений для Telegram ботов.
-
-Исходное задание: {description}
-
-Результаты анализа:
-- Назначение: {bot_purpose}
-- Ключевые функции: {key_features}
-- Взаимодействия: {user_interactions}
-- Сложность: {complexity_level}
-- Требования: {special_requirements}
-
-На основе анализа подбери оптимальный набор инструментов:
-1. Версия aiogram (3.x - современная, используй её)
-2. База данных (sqlite - для простых, postgresql - для сложных, none - если не нужна)
-3. Дополнительные библиотеки (requests для API, pillow для изображений и т.д.)
-4. Необходимые API интеграции (если требуется работа с внешними сервисами)
-5. Middleware компоненты (логирование, аналитика, антиспам и т.д.)
-6. Способ управления состояниями (FSM для диалогов, memory для простого хранения, none если не нужно)
-
-ВАЖНО: Отвечай строго в формате JSON со следующими полями:
-{{
-  "framework_version": "...",
-  "database": "sqlite|postgresql|none",
-  "additional_libraries": "...",
-  "api_integrations": "...",
-  "middleware_needs": "...",
-  "state_management": "FSM|memory|none"
-}}"""
-    )
-    
-    chain = prompt | llm | SimpleJsonOutputParser()
+    chain = TOOLS_PROMPT | with_retry(llm.with_structured_output(ToolsOut))
     
     try:
-        result = chain.invoke({
+        result = await _memo_invoke("tools_selection_chain", chain, {
             "description": description,
             "bot_purpose": analysis.get("bot_purpose", ""),
             "key_features": analysis.get("key_features", ""),
@@ -149,10 +530,10 @@ def tools_selection_chain(analysis: dict, description: str) -> dict:
             "complexity_level": analysis.get("complexity_level", "simple"),
             "special_requirements": analysis.get("special_requirements", "")
         })
-        logger.info(f"Tools selection завершен: db={result.get('database', 'N/A')}, state={result.get('state_management', 'N/A')}")
+        logger.info("Tools selection завершен: db=%s, state=%s", result.get('database', 'N/A'), result.get('state_management', 'N/A'))
         return result
     except Exception as e:
-        logger.warning(f"Ошибка парсинга в tools_selection_chain: {e}. Используются значения по умолчанию")
+        logger.warning("Ошибка парсинга в tools_selection_chain: %s. Используются значения по умолчанию", e)
         return {
             "framework_version": "aiogram 3.x",
             "database": "none",
@@ -163,54 +544,17 @@ def tools_selection_chain(analysis: dict, description: str) -> dict:
         }
 
 
-def structure_chain(analysis: dict, tools: dict, description: str) -> dict:
+async def structure_chain(analysis: dict, tools: dict, description: str) -> dict:
     """
     Цепочка 3: Создание структуры кода
     """
     logger.info("Запуск structure_chain")
-    llm = create_llm()
+    llm = create_llm("fast")
     
-    prompt = ChatPromptTemplate.from_template(
-        """Ты — senior Python разработчик, специалист по архитектуре Telegram ботов.
-
-Исходное задание: {description}
-
-Анализ:
-- Назначение: {bot_purpose}
-- Функции: {key_features}
-- Сложность: {complexity_level}
-
-Инструменты:
-- Framework: {framework_version}
-- БД: {database}
-- Библиотеки: {additional_libraries}
-- Состояния: {state_management}
-
-Спроектируй детальную структуру кода:
-1. Команды - список всех команд бота (/start, /help и т.д.)
-2. Handlers - обработчики (command_handler, message_handler, callback_handler и т.д.)
-3. States - состояния FSM если используется диалоговая логика
-4. Keyboards - какие клавиатуры нужны (reply для обычных, inline для кнопок под сообщениями)
-5. Modules - структура файлов (handlers.py, keyboards.py, database.py и т.д.)
-6. Data models - модели данных (классы для пользователей, записей и т.д.)
-7. Helper functions - вспомогательные функции (валидация, форматирование и т.д.)
-
-ВАЖНО: Отвечай строго в формате JSON со следующими полями:
-{{
-  "commands": "...",
-  "handlers": "...",
-  "states": "...",
-  "keyboards": "...",
-  "modules": "...",
-  "data_models": "...",
-  "helper_functions": "..."
-}}"""
-    )
-    
-    chain = prompt | llm | SimpleJsonOutputParser()
+    chain = STRUCTURE_PROMPT | with_retry(llm.with_structured_output(StructureOut))
     
     try:
-        result = chain.invoke({
+        result = await _memo_invoke("structure_chain", chain, {
             "description": description,
             "bot_purpose": analysis.get("bot_purpose", ""),
             "key_features": analysis.get("key_features", ""),
@@ -222,10 +566,10 @@ def structure_chain(analysis: dict, tools: dict, description: str) -> dict:
         })
         commands = result.get('commands', '')
         handlers = result.get('handlers', '')
-        logger.info(f"Structure chain завершен: commands={commands}, handlers={handlers}")
+        logger.info("Structure chain завершен: commands=%s, handlers=%s", commands, handlers)
         return result
     except Exception as e:
-        logger.warning(f"Ошибка парсинга в structure_chain: {e}. Используются значения по умолчанию")
+        logger.warning("Ошибка парсинга в structure_chain: %s. Используются значения по умолчанию", e)
         return {
             "commands": "/start, /help",
             "handlers": "command_handler, message_handler",
@@ -237,132 +581,306 @@ def structure_chain(analysis: dict, tools: dict, description: str) -> dict:
         }
 
 
-def code_chain(analysis: dict, tools: dict, structure: dict, description: str) -> str:
+async def plan_chain(description: str) -> dict:
     """
-    Цепочка 4: Реализация кода бота
+    Цепочки 1-3 одним запросом: анализ, подбор инструментов и структура кода.
+    
+    Разделы, которые не удалось разобрать, добираются отдельными цепочками.
     """
-    logger.info("Запуск code_chain")
-    llm = create_llm()
+    logger.info("Запуск plan_chain")
+    llm = create_llm("fast")
+    
+    chain = PLAN_PROMPT | with_retry(llm.with_structured_output(PlanOut))
+    
+    try:
+        result = await _memo_invoke("plan_chain", chain, {"description": description})
+    except Exception as e:
+        logger.warning("Ошибка парсинга в plan_chain: %s. Используются отдельные цепочки", e)
+        result = {}
+    
+    def section(name: str) -> Optional[dict]:
+        value = result.get(name)
+        return value if isinstance(value, dict) and value else None
     
-    prompt = ChatPromptTemplate.from_template(
-        """Ты — expert Python разработчик, специализирующийся на Telegram ботах с aiogram 3.x.
+    analysis = section("analysis")
+    if analysis is None:
+        logger.warning("В плане нет раздела analysis, запускается analysis_chain")
+        analysis = await analysis_chain(description)
+    tools = section("tools")
+    if tools is None:
+        logger.warning("В плане нет раздела tools, запускается tools_selection_chain")
+        tools = await tools_selection_chain(analysis, description)
+    structure = section("structure")
+    if structure is None:
+        logger.warning("В плане нет раздела structure, запускается structure_chain")
+        structure = await structure_chain(analysis, tools, description)
+    
+    logger.info("Plan chain завершен: complexity=%s", analysis.get('complexity_level', 'N/A'))
+    return {"analysis": analysis, "tools": tools, "structure": structure}
 
-Исходное задание: {description}
 
-АНАЛИЗ:
-- Назначение: {bot_purpose}
-- Функции: {key_features}
-- Сложность: {complexity_level}
+def strip_code_fences(text: str) -> str:
+    """Извлекает код из markdown-блока ```python ... ``` (или ``` ... ```), если он есть"""
+    start = text.find("```python")
+    if start >= 0:
+        start += len("```python")
+    else:
+        start = text.find("```")
+        if start < 0:
+            return text.strip()
+        start += len("```")
+    end = text.find("```", start)
+    return (text[start:end] if end >= 0 else text[start:]).strip()
 
-ИНСТРУМЕНТЫ:
-- Framework: {framework_version}
-- База данных: {database}
-- Библиотеки: {additional_libraries}
-- Управление состояниями: {state_management}
 
-СТРУКТУРА КОДА:
-- Команды: {commands}
-- Обработчики: {handlers}
-- Состояния FSM: {states}
-- Клавиатуры: {keyboards}
-- Модули: {modules}
-- Модели данных: {data_models}
-- Вспомогательные функции: {helper_functions}
+@dataclass(frozen=True)
+class CodeStats:
+    """Размер сгенерированного кода, считается один раз"""
+    chars: int
+    lines: int
+    
+    @classmethod
+    def from_code(cls, code: str) -> "CodeStats":
+        return cls(chars=len(code), lines=code.count("\n") + 1 if code else 0)
 
-Сгенерируй ПОЛНЫЙ рабочий код Telegram бота на Python.
 
-КРИТИЧЕСКИ ВАЖНЫЕ требования:
-1. Использовать ТОЛЬКО aiogram 3.x (не 2.x!)
-2. Все handlers ОБЯЗАТЕЛЬНО async def
-3. Токен бота читается из os.getenv("BOT_TOKEN")
-4. Используй современный синтаксис: Router, Dispatcher
-5. Импорты: from aiogram import Bot, Dispatcher, Router, F
-6. Для запуска: await dp.start_polling(bot)
-7. Добавь logging (import logging, logging.basicConfig)
-8. Обработка ошибок try/except где необходимо
-9. Если нужны состояния - используй FSM из aiogram.fsm
-10. Если нужны клавиатуры - используй ReplyKeyboardMarkup или InlineKeyboardMarkup
-11. Код ПОЛНОСТЬЮ готов к запуску, БЕЗ заглушек, TODO или комментариев "добавьте свой код"
-12. Все функции РЕАЛИЗОВАНЫ полностью
+class FenceStripper:
+    """
+    Построчно убирает markdown-ограждение ```python ... ``` из потока кода:
+    пропускает открывающую строку с ``` и останавливается на закрывающей
+    """
+    
+    def __init__(self):
+        self._pending = ""
+        self._state = "start"  # start -> code -> done
+    
+    def feed(self, chunk: str) -> str:
+        """Принимает очередной фрагмент потока и возвращает готовые строки кода"""
+        self._pending += chunk
+        lines = self._pending.split("\n")
+        self._pending = lines.pop()
+        return "".join(self._line(line, "\n") for line in lines)
+    
+    def flush(self) -> str:
+        """Возвращает остаток потока после последнего перевода строки"""
+        rest, self._pending = self._pending, ""
+        return self._line(rest, "")
+    
+    def _line(self, line: str, end: str) -> str:
+        if self._state == "done":
+            return ""
+        if line.lstrip().startswith("```"):
+            self._state = "code" if self._state == "start" else "done"
+            return ""
+        if self._state == "start":
+            if not line.strip():
+                return ""
+            self._state = "code"
+        return line + end
 
-Верни ТОЛЬКО код Python, без объяснений и без markdown форматирования."""
-    )
+
+async def code_chain(analysis: dict, tools: dict, structure: dict, description: str,
+                     stream: bool = True, output_file: Optional[str] = None) -> Tuple[str, bool]:
+    """
+    Цепочка 4: Реализация кода бота
     
-    chain = prompt | llm
+    Args:
+        stream: Выводить код в консоль по мере генерации (в пакетном режиме выключено)
+        output_file: Файл, в который код записывается по мере генерации (только при stream);
+                     запись идет в <output_file>.part, который по завершении атомарно
+                     переименовывается в output_file
     
-    result = chain.invoke({
+    Returns:
+        Код бота и признак того, что он уже сохранен в output_file
+    """
+    logger.info("Запуск code_chain")
+    llm = create_llm("code")
+    
+    chain = CODE_PROMPT | with_retry(llm)
+    
+    inputs = {
         "description": description,
         "bot_purpose": analysis.get("bot_purpose", ""),
         "key_features": analysis.get("key_features", ""),
         "complexity_level": analysis.get("complexity_level", "simple"),
         "framework_version": tools.get("framework_version", "aiogram 3.x"),
         "database": tools.get("database", "none"),
-        "additional_libraries": tools.get("additional_libraries", []),
+        "additional_libraries": tools.get("additional_libraries", ""),
         "state_management": tools.get("state_management", "none"),
-        "commands": structure.get("commands", []),
-        "handlers": structure.get("handlers", []),
-        "states": structure.get("states", []),
-        "keyboards": structure.get("keyboards", []),
-        "modules": structure.get("modules", []),
-        "data_models": structure.get("data_models", []),
-        "helper_functions": structure.get("helper_functions", [])
-    })
-    
-    code = result.content
-    
-    # Очистка от markdown форматирования
-    if "```python" in code:
-        code = code.split("```python")[1].split("```")[0]
-    elif "```" in code:
-        code = code.split("```")[1].split("```")[0]
-    
-    code = code.strip()
-    logger.info(f"Code chain завершен: {len(code)} символов, {len(code.splitlines())} строк")
-    return code
+        "commands": structure.get("commands", ""),
+        "handlers": structure.get("handlers", ""),
+        "states": structure.get("states", ""),
+        "keyboards": structure.get("keyboards", ""),
+        "modules": structure.get("modules", ""),
+        "data_models": structure.get("data_models", ""),
+        "helper_functions": structure.get("helper_functions", "")
+    }
+    
+    if not stream:
+        code = strip_code_fences((await chain.ainvoke(inputs)).content)
+        logger.info("Code chain завершен: %s символов", len(code))
+        return code, False
+    
+    # Код выводится по мере генерации, чтобы не ждать последнего токена,
+    # и сразу без markdown-ограждения пишется во временный файл
+    part_path = output_file + ".part" if output_file else None
+    part_file = None
+    if part_path:
+        try:
+            part_file = open(part_path, "w", encoding="utf-8")
+        except OSError as e:
+            logger.warning("Не удалось открыть %s, код будет сохранен после генерации: %s", part_path, e)
+    
+    def write_part(text: str) -> None:
+        # При ошибке записи генерация продолжается, а код сохраняется из памяти
+        nonlocal part_file
+        if part_file is None or not text:
+            return
+        try:
+            part_file.write(text)
+            written.append(text)
+        except OSError as e:
+            logger.warning("Ошибка записи %s, код будет сохранен после генерации: %s", part_path, e)
+            with contextlib.suppress(OSError):
+                part_file.close()
+            part_file = None
+    
+    stripper = FenceStripper()
+    parts = []
+    written = []
+    try:
+        async for chunk in chain.astream(inputs):
+            if not chunk.content:
+                continue
+            parts.append(chunk.content)
+            sys.stdout.write(chunk.content)
+            sys.stdout.flush()
+            write_part(stripper.feed(chunk.content))
+        print()
+        write_part(stripper.flush())
+        
+        code = strip_code_fences("".join(parts))
+        saved = False
+        if part_file is not None:
+            try:
+                # Если ответ не укладывается в построчный разбор (например, текст перед
+                # блоком кода), файл перезаписывается результатом strip_code_fences
+                if "".join(written).strip() != code:
+                    part_file.seek(0)
+                    part_file.truncate()
+                    part_file.write(code)
+                part_file.close()
+                os.replace(part_path, output_file)
+                saved = True
+            except OSError as e:
+                logger.warning("Не удалось сохранить %s, код будет сохранен после генерации: %s", part_path, e)
+    finally:
+        with contextlib.suppress(OSError):
+            if part_file is not None and not part_file.closed:
+                part_file.close()
+            if part_path and os.path.exists(part_path):
+                os.remove(part_path)
+    
+    logger.info("Code chain завершен: %s символов", len(code))
+    return code, saved
 
 
-def review_chain(code: str) -> dict:
+def local_review(code: str) -> dict:
     """
-    Цепочка 5: Финальная проверка кода
+    Локальная проверка кода без обращения к LLM: синтаксис (ast), импорты aiogram 3.x,
+    наличие async обработчиков и запуска polling
+    
+    Returns:
+        Словарь в том же формате, что и у review_chain
     """
-    logger.info("Запуск review_chain")
-    logger.debug(f"Проверка кода: {len(code)} символов")
-    llm = create_llm()
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return {
+            "is_valid": "no",
+            "syntax_errors": f"строка {e.lineno}: {e.msg}",
+            "structure_issues": "none",
+            "import_issues": "none",
+            "recommendations": "Исправьте синтаксические ошибки"
+        }
+    
+    imports_aiogram = False
+    uses_executor = False
+    has_async_handlers = False
+    has_polling = False
+    has_error_handling = False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module:
+            if node.module.split(".")[0] == "aiogram":
+                imports_aiogram = True
+                if any(alias.name == "executor" for alias in node.names):
+                    uses_executor = True
+        elif isinstance(node, ast.Import):
+            if any(alias.name.split(".")[0] == "aiogram" for alias in node.names):
+                imports_aiogram = True
+        elif isinstance(node, ast.AsyncFunctionDef):
+            has_async_handlers = True
+        elif isinstance(node, ast.Attribute) and node.attr == "start_polling":
+            has_polling = True
+        elif isinstance(node, ast.Try):
+            has_error_handling = True
     
-    prompt = ChatPromptTemplate.from_template(
-        """Ты — опытный код-ревьюер Python кода.
+    import_issues = []
+    if not imports_aiogram:
+        import_issues.append("нет импортов aiogram")
+    if uses_executor:
+        import_issues.append("executor из aiogram 2.x")
+    structure_issues = []
+    if not has_async_handlers:
+        structure_issues.append("нет async обработчиков")
+    if not has_polling:
+        structure_issues.append("нет запуска start_polling")
+    
+    is_valid = not import_issues and not structure_issues
+    if not has_error_handling:
+        recommendations = "Добавьте обработку ошибок (try/except)"
+    elif is_valid:
+        recommendations = "Код готов к использованию"
+    else:
+        recommendations = "Исправьте найденные проблемы"
+    
+    return {
+        "is_valid": "yes" if is_valid else "no",
+        "syntax_errors": "none",
+        "structure_issues": ", ".join(structure_issues) or "none",
+        "import_issues": ", ".join(import_issues) or "none",
+        "recommendations": recommendations
+    }
 
-Проверь следующий код Telegram бота:
 
-```python
-{code}
-```
+async def review_chain(code: str) -> dict:
+    """
+    Финальная проверка кода: локальная, а при REVIEW_WITH_LLM=1 и найденных
+    проблемах - дополнительно через LLM
+    """
+    result = local_review(code)
+    logger.info("Локальная проверка завершена: is_valid=%s", result['is_valid'])
+    if result["is_valid"] == "yes" or os.getenv("REVIEW_WITH_LLM", "0") != "1":
+        return result
+    return await llm_review_chain(code)
 
-Проверь:
-1. Синтаксические ошибки
-2. Корректность структуры запуска бота
-3. Правильность импортов (aiogram 3.x)
-4. Наличие обработки ошибок
-5. Общее качество кода
 
-ВАЖНО: Отвечай строго в формате JSON со следующими полями:
-{{
-  "is_valid": "yes|no",
-  "syntax_errors": "...",
-  "structure_issues": "...",
-  "import_issues": "...",
-  "recommendations": "..."
-}}"""
-    )
+async def llm_review_chain(code: str) -> dict:
+    """
+    Цепочка 5: Финальная проверка кода
+    """
+    logger.info("Запуск llm_review_chain")
+    logger.debug("Проверка кода: %s символов", len(code))
+    llm = create_llm("fast")
     
-    chain = prompt | llm | SimpleJsonOutputParser()
+    chain = REVIEW_PROMPT | with_retry(llm.with_structured_output(ReviewOut))
     
     try:
-        result = chain.invoke({"code": code})
-        logger.info(f"Review chain завершен: is_valid={result.get('is_valid', 'N/A')}")
+        result = await _memo_invoke("llm_review_chain", chain, {"code": code})
+        logger.info("Review chain завершен: is_valid=%s", result.get('is_valid', 'N/A'))
         return result
     except Exception as e:
-        logger.warning(f"Ошибка парсинга в review_chain: {e}. Используются значения по умолчанию")
+        logger.warning("Ошибка парсинга в llm_review_chain: %s. Используются значения по умолчанию", e)
         return {
             "is_valid": "yes",
             "syntax_errors": "none",
@@ -372,131 +890,320 @@ def review_chain(code: str) -> dict:
         }
 
 
-def generate_bot(description: str) -> str:
+def _compact(section: dict) -> dict:
     """
-    Главная функция: запускает полную цепочку генерации бота (4 этапа + проверка)
+    Сокращает раздел плана перед передачей в code_chain: удаляет пустые значения
+    ("", "none", "N/A") и обрезает длинные строки до MAX_FIELD_LEN по границе слова
+    """
+    compacted = {}
+    for key, value in section.items():
+        text = str(value).strip()
+        if text.lower() in EMPTY_VALUES:
+            continue
+        if len(text) > MAX_FIELD_LEN:
+            cut = text.rfind(" ", 0, MAX_FIELD_LEN)
+            text = text[:cut if cut > 0 else MAX_FIELD_LEN].rstrip() + "..."
+        compacted[key] = text
+    return compacted
+
+
+def write_lines(lines: List[str]) -> None:
+    """Выводит набор строк одной операцией записи в stdout"""
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+def save_code(output_file: str, code: str) -> None:
+    """Сохраняет сгенерированный код в файл"""
+    Path(output_file).write_text(code, encoding="utf-8")
+
+
+async def generate_bot(description: str) -> str:
+    """
+    Главная функция: запускает полную цепочку генерации бота (план, код + проверка)
     """
     logger.info("="*80)
     logger.info("Запуск генерации Telegram бота")
-    logger.info(f"Описание: {description}")
+    logger.info("Описание: %s", description)
     logger.info("="*80)
     
-    print("\n" + "="*80)
-    print("🤖 ГЕНЕРАТОР TELEGRAM БОТОВ (LangChain Pipeline)")
-    print("="*80)
-    
-    # Шаг 1: Анализ задания
-    print("\n📊 ШАГ 1/4: Анализ задания бота...")
-    analysis = analysis_chain(description)
-    print("✅ Анализ завершен")
-    print(f"   • Назначение: {analysis.get('bot_purpose', 'N/A')}")
-    print(f"   • Уровень сложности: {analysis.get('complexity_level', 'N/A')}")
-    key_features = analysis.get('key_features', 'N/A')
-    if len(str(key_features)) > 100:
-        print(f"   • Ключевые функции: {str(key_features)[:100]}...")
+    write_lines([
+        "",
+        "="*80,
+        "🤖 ГЕНЕРАТОР TELEGRAM БОТОВ (LangChain Pipeline)",
+        "="*80,
+        "",
+        # Шаг 1: Анализ задания, подбор инструментов и структура кода одним запросом
+        "📊 ШАГ 1/2: Анализ задания, подбор инструментов и структура кода...",
+    ])
+    plan = await plan_chain(description)
+    analysis = plan["analysis"]
+    tools = plan["tools"]
+    structure = plan["structure"]
+    
+    lines = [
+        "✅ Анализ завершен",
+        f"   • Назначение: {analysis.get('bot_purpose', 'N/A')}",
+        f"   • Уровень сложности: {analysis.get('complexity_level', 'N/A')}",
+    ]
+    key_features = str(analysis.get('key_features', 'N/A'))
+    if len(key_features) > 100:
+        lines.append(f"   • Ключевые функции: {key_features[:100]}...")
     else:
-        print(f"   • Ключевые функции: {key_features}")
-    
-    # Шаг 2: Подбор инструментов
-    print("\n🔧 ШАГ 2/4: Подбор инструментов для генерации...")
-    tools = tools_selection_chain(analysis, description)
-    print("✅ Инструменты подобраны")
-    print(f"   • Framework: {tools.get('framework_version', 'N/A')}")
-    print(f"   • База данных: {tools.get('database', 'none')}")
-    print(f"   • Управление состояниями: {tools.get('state_management', 'none')}")
+        lines.append(f"   • Ключевые функции: {key_features}")
+    
+    lines += [
+        "✅ Инструменты подобраны",
+        f"   • Framework: {tools.get('framework_version', 'N/A')}",
+        f"   • База данных: {tools.get('database', 'none')}",
+        f"   • Управление состояниями: {tools.get('state_management', 'none')}",
+    ]
     additional_libs = tools.get('additional_libraries', '')
     if additional_libs and additional_libs != 'none':
-        print(f"   • Доп. библиотеки: {additional_libs}")
-    
-    # Шаг 3: Создание структуры
-    print("\n🏗️ ШАГ 3/4: Создание структуры кода...")
-    structure = structure_chain(analysis, tools, description)
-    print("✅ Структура создана")
-    commands = structure.get('commands', 'N/A')
-    print(f"   • Команды: {commands}")
-    handlers = structure.get('handlers', 'N/A')
-    print(f"   • Обработчики: {handlers}")
+        lines.append(f"   • Доп. библиотеки: {additional_libs}")
+    
+    lines += [
+        "✅ Структура создана",
+        f"   • Команды: {structure.get('commands', 'N/A')}",
+        f"   • Обработчики: {structure.get('handlers', 'N/A')}",
+    ]
     keyboards = structure.get('keyboards', '')
     if keyboards:
-        print(f"   • Клавиатуры: {keyboards}")
-    
-    # Шаг 4: Реализация кода
-    print("\n💻 ШАГ 4/4: Реализация кода бота...")
-    code = code_chain(analysis, tools, structure, description)
-    print("✅ Код реализован")
-    print(f"   • Размер: {len(code)} символов")
-    print(f"   • Строк кода: {len(code.splitlines())}")
-    
-    # Финальная проверка
-    print("\n🔍 ФИНАЛЬНАЯ ПРОВЕРКА: Валидация кода...")
-    review = review_chain(code)
-    print("✅ Проверка завершена")
-    print(f"   • Статус: {review.get('is_valid', 'yes')}")
-    print(f"   • Синтаксические ошибки: {review.get('syntax_errors', 'none')}")
+        lines.append(f"   • Клавиатуры: {keyboards}")
     
-    if review.get('recommendations') and review.get('recommendations') != 'Код готов к использованию':
-        print(f"\n💡 Рекомендации: {review.get('recommendations')}")
+    # Шаг 2: Реализация кода
+    lines += ["", "💻 ШАГ 2/2: Реализация кода бота..."]
+    write_lines(lines)
     
-    # Сохранение файла
     output_file = "generated_bot.py"
-    try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(code)
-        logger.info(f"Бот сохранен в файл: {output_file}")
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении файла: {e}")
-        print(f"\n❌ Ошибка при сохранении файла: {e}")
+    code, saved = await code_chain(_compact(analysis), _compact(tools), _compact(structure), description,
+                                   output_file=output_file)
+    stats = CodeStats.from_code(code)
+    logger.info("Код бота: %s символов, %s строк", stats.chars, stats.lines)
+    
+    # Финальная проверка идет параллельно с сохранением файла: код она не меняет
+    write_lines([
+        "✅ Код реализован",
+        f"   • Размер: {stats.chars} символов",
+        f"   • Строк кода: {stats.lines}",
+        "",
+        "🔍 ФИНАЛЬНАЯ ПРОВЕРКА: Валидация кода...",
+    ])
+    review_task = asyncio.create_task(review_chain(code))
+    
+    save_error = None
+    if not saved:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, save_code, output_file, code)
+        except Exception as e:
+            save_error = e
+    if save_error is None:
+        logger.info("Бот сохранен в файл: %s", output_file)
+    
+    review = await review_task
+    lines = [
+        "✅ Проверка завершена",
+        f"   • Статус: {review.get('is_valid', 'yes')}",
+        f"   • Синтаксические ошибки: {review.get('syntax_errors', 'none')}",
+    ]
+    
+    if review.get('recommendations') and review.get('recommendations') != 'Код готов к использованию':
+        lines += ["", f"💡 Рекомендации: {review.get('recommendations')}"]
+    
+    if save_error is not None:
+        logger.error("Ошибка при сохранении файла: %s", save_error)
+        lines += ["", f"❌ Ошибка при сохранении файла: {save_error}"]
+        write_lines(lines)
         return code
     
-    print("\n" + "="*80)
-    print(f"✅ БОТ УСПЕШНО СГЕНЕРИРОВАН: {output_file}")
-    print("="*80)
-    print("\n📝 Для запуска бота:")
-    print(f"   1. Установите зависимости: pip install aiogram python-dotenv")
+    lines += [
+        "",
+        "="*80,
+        f"✅ БОТ УСПЕШНО СГЕНЕРИРОВАН: {output_file}",
+        "="*80,
+        "",
+        "📝 Для запуска бота:",
+        "   1. Установите зависимости: pip install aiogram python-dotenv",
+    ]
     
     # Проверяем, нужны ли дополнительные зависимости
-    additional_libs = tools.get('additional_libraries', '')
     if additional_libs and additional_libs != 'none' and additional_libs.strip():
-        print(f"   2. Установите доп. библиотеки: pip install {additional_libs}")
-        print(f"   3. Добавьте BOT_TOKEN в .env файл")
-        print(f"   4. Запустите: python {output_file}")
+        lines += [
+            f"   2. Установите доп. библиотеки: pip install {additional_libs}",
+            "   3. Добавьте BOT_TOKEN в .env файл",
+            f"   4. Запустите: python {output_file}",
+        ]
     else:
-        print(f"   2. Добавьте BOT_TOKEN в .env файл")
-        print(f"   3. Запустите: python {output_file}")
-    print()
+        lines += [
+            "   2. Добавьте BOT_TOKEN в .env файл",
+            f"   3. Запустите: python {output_file}",
+        ]
+    lines.append("")
+    write_lines(lines)
     
     return code
 
+async def _generate_batch_item(number: int, description: str, semaphore: asyncio.Semaphore) -> dict:
+    """Генерирует один бот пакета без вывода в консоль и сохраняет его в generated_bot_<номер>.py"""
+    async with semaphore:
+        plan = await plan_chain(description)
+        code, _ = await code_chain(_compact(plan["analysis"]), _compact(plan["tools"]),
+                                   _compact(plan["structure"]), description, stream=False)
+    
+    output_file = f"generated_bot_{number}.py"
+    review_task = asyncio.create_task(review_chain(code))
+    await asyncio.get_running_loop().run_in_executor(None, save_code, output_file, code)
+    logger.info("Бот %s сохранен в файл: %s", number, output_file)
+    return {"file": output_file, "review": await review_task, "stats": CodeStats.from_code(code)}
 
-def main():
-    """Основная функция"""
-    # Настройка логирования
-    setup_logger()
+
+async def generate_bots(descriptions: List[str]) -> int:
+    """
+    Пакетная генерация: планы и код для всех описаний запрашиваются параллельно
+    (не более BATCH_CONCURRENCY ботов одновременно)
+    
+    Returns:
+        Количество ботов, которые не удалось сгенерировать
+    """
+    write_lines([
+        "",
+        "="*80,
+        f"🤖 ПАКЕТНАЯ ГЕНЕРАЦИЯ TELEGRAM БОТОВ: {len(descriptions)} шт.",
+        "="*80,
+    ])
+    
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_generate_batch_item(number, description, semaphore)
+          for number, description in enumerate(descriptions, 1)),
+        return_exceptions=True
+    )
+    
+    failed = 0
+    lines = []
+    for number, (description, result) in enumerate(zip(descriptions, results), 1):
+        short = description if len(description) <= 60 else description[:60] + "..."
+        if isinstance(result, Exception):
+            failed += 1
+            logger.error("Ошибка при генерации бота %s: %s", number, result)
+            lines += ["", f"❌ {number}. {short}", f"   Ошибка: {result}"]
+            continue
+        review = result["review"]
+        lines += [
+            "",
+            f"✅ {number}. {short}",
+            f"   • Файл: {result['file']} ({result['stats'].lines} строк)",
+            f"   • Статус проверки: {review.get('is_valid', 'yes')}",
+        ]
+    
+    lines += [
+        "",
+        "="*80,
+        f"Готово: {len(descriptions) - failed} из {len(descriptions)}",
+        "="*80,
+        "",
+    ]
+    write_lines(lines)
+    return failed
+
+
+def read_batch_file(path: str) -> List[str]:
+    """Читает описания ботов из файла: по одному описанию на строку, пустые строки пропускаются"""
+    text = Path(path).read_text(encoding="utf-8")
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+async def run_batch(descriptions: List[str]) -> int:
+    """Запускает пакетную генерацию и освобождает соединения по ее завершении"""
+    try:
+        return await generate_bots(descriptions)
+    finally:
+        await close_llm()
+
+
+async def run_generation(description: str) -> str:
+    """Запускает генерацию и освобождает соединения по ее завершении"""
+    try:
+        return await generate_bot(description)
+    finally:
+        await close_llm()
+
+
+def main_batch(path: Optional[str]) -> int:
+    """
+    Пакетный режим: python script_bot.py --batch descriptions.txt
+    
+    Returns:
+        Код завершения (0 - все боты сгенерированы)
+    """
+    if not path:
+        logger.error("Не указан файл с описаниями")
+        print("❌ Использование: python script_bot.py --batch descriptions.txt")
+        return 1
+    
+    try:
+        descriptions = read_batch_file(path)
+    except OSError as e:
+        logger.error("Не удалось прочитать файл %s: %s", path, e)
+        print(f"❌ Не удалось прочитать файл {path}: {e}")
+        return 1
+    if not descriptions:
+        print(f"❌ В файле {path} нет описаний ботов")
+        return 1
+    
+    logger.info("Пакетная генерация: %s описаний из %s", len(descriptions), path)
+    try:
+        failed = asyncio.run(run_batch(descriptions))
+    except KeyboardInterrupt:
+        logger.warning("Генерация прервана пользователем")
+        print("\n\n❌ Генерация прервана пользователем")
+        return 130
+    return 0 if failed == 0 else 1
+
+
+def main(description: Optional[str] = None) -> int:
+    """
+    Основная функция
+    
+    Args:
+        description: Описание бота; если не передано, берется из аргументов командной строки
+    
+    Returns:
+        Код завершения (0 - успех, 130 - прервано пользователем)
+    """
     logger.info("Запуск script_bot.py")
+    setup_llm_cache()
     
-    if len(sys.argv) < 2:
-        logger.error("Не указано описание бота")
-        print("❌ Использование: python script_bot.py \"Описание бота\"")
-        print("\nПример:")
-        print('   python script_bot.py "Бот, который отправляет случайные мемы"')
-        sys.exit(1)
+    if description is None:
+        if len(sys.argv) < 2:
+            logger.error("Не указано описание бота")
+            print("❌ Использование: python script_bot.py \"Описание бота\"")
+            print("   или: python script_bot.py --batch descriptions.txt")
+            print("\nПример:")
+            print('   python script_bot.py "Бот, который отправляет случайные мемы"')
+            return 1
+        if sys.argv[1] == "--batch":
+            return main_batch(sys.argv[2] if len(sys.argv) > 2 else None)
+        description = sys.argv[1]
     
-    description = sys.argv[1]
-    logger.info(f"Получено описание: {description}")
+    logger.info("Получено описание: %s", description)
     
     try:
-        generate_bot(description)
+        asyncio.run(run_generation(description))
         logger.info("Генерация бота успешно завершена")
+        return 0
     except KeyboardInterrupt:
         logger.warning("Генерация прервана пользователем")
         print("\n\n❌ Генерация прервана пользователем")
-        sys.exit(0)
+        return 130
     except Exception as e:
-        logger.error(f"Ошибка при генерации бота: {e}", exc_info=True)
+        logger.error("Ошибка при генерации бота: %s", e, exc_info=True)
         print(f"\n❌ Ошибка при генерации бота: {e}")
-        sys.exit(1)
+        return 1
 
 
 if __name__ == "__main__":
-    main()
-
+    # Логирование настраивается только при запуске из командной строки:
+    # при вызове main() из common_prompts.py корневой логгер CLI не трогается
+    setup_logger()
+    sys.exit(main())
@@ -4,115 +4,131 @@
 """
 
 import os
+import re
 import sys
+import json
+import math
+import asyncio
+import hashlib
 import logging
+import operator
+from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.output_parsers.json import SimpleJsonOutputParser
+from pydantic import BaseModel
+
+# LangChain и httpx импортируются при первом обращении к LLM: разбор аргументов
+# и вывод справки не ждут их загрузки
+if TYPE_CHECKING:
+    import httpx
+    from langchain_core.messages import HumanMessage
+    from langchain_openai import ChatOpenAI
+
+# orjson (опционально) разбирает и сериализует JSON в несколько раз быстрее
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# h2 (опционально) включает HTTP/2: параллельные запросы идут по одному соединению
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Общий пул соединений для всех цепочек, эмбеддингов и тем пакетной генерации
+HTTP_LIMITS = {"max_keepalive_connections": 20, "max_connections": 50, "keepalive_expiry": 30.0}
 
-def setup_logger() -> None:
-    """Настройка логирования"""
-    level_name = os.getenv("LOG_LEVEL", "INFO").upper()
-    level = getattr(logging, level_name, logging.INFO)
-    logging.basicConfig(
-        level=level,
-        format="%(asctime)s %(levelname)s %(name)s - %(message)s",
-    )
+_http_client: Optional["httpx.AsyncClient"] = None
 
+# Кэш ответов LLM: повторная генерация с теми же промптами не тратит токены
+LLM_CACHE_PATH = ".langchain_post_cache.db"
 
-def create_llm():
-    """Создает экземпляр LLM"""
-    api_key = os.getenv("OPENAI_API_KEY")
-    base_url = os.getenv("OPENAI_BASE_URL")
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    
-    if not api_key:
-        logger.error("OPENAI_API_KEY не найден в .env файле!")
-        print("❌ OPENAI_API_KEY не найден в .env файле!")
-        sys.exit(1)
-    
-    kwargs = {
-        "api_key": api_key,
-        "model": model,
-        "temperature": 0.7
-    }
-    
-    if base_url and base_url.strip():
-        kwargs["base_url"] = base_url
-        logger.debug(f"Используется ProxyAPI: {base_url}")
-    
-    logger.debug(f"Создан LLM клиент: model={model}, temperature=0.7")
-    return ChatOpenAI(**kwargs)
+# Семантический кэш этапов анализа, стиля и структуры для близких по смыслу тем
+STAGE_CACHE_FILE = Path(".post_stage_cache.json")
 
+# Точный кэш тех же этапов: один файл на этап, ключ - хэш модели, темы и исходного текста
+STAGE_CACHE_DIR = Path(".post_stage_cache")
+
+# Подробный вывод результатов этапов в консоль (0 - только заголовки шагов и итог)
+VERBOSE = os.getenv("VERBOSE", "1") == "1"
+
+# Сколько запросов к LLM одного этапа выполняется одновременно в пакетном режиме
+BATCH_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
 
-def analysis_chain(topic: str, source_text: str = "") -> dict:
-    """
-    Цепочка 1: Анализ темы и исходного материала
-    """
-    logger.info("Запуск analysis_chain")
-    logger.debug(f"Тема: {topic[:100]}...")
-    llm = create_llm()
-    
-    prompt = ChatPromptTemplate.from_template(
-        """Ты — контент-аналитик и эксперт по созданию вовлекающего контента.
+
+# Поля плана, которые передаются в генерацию поста (остальные модели не нужны)
+PLAN_FIELDS = {
+    "analysis": ("post_goal", "target_audience", "tone_style", "desired_length"),
+    "style": ("structure", "use_emoji", "hashtags", "formatting"),
+    "structure": ("headline", "intro", "main_blocks", "conclusion", "cta_text"),
+}
+EMPTY_VALUES = {"", "none", "нет", "n/a"}
+
+# Локальная проверка поста: если она пройдена, review_chain не вызывается.
+# Границы длины в символах шире, чем в промпте, чтобы не гонять LLM из-за небольших отклонений
+LENGTH_BOUNDS = {"short": (100, 800), "medium": (300, 2500), "long": (1000, None)}
+# Заглушка - это токен вида [TODO], [TBD: ...], [Вставьте ссылку] или lorem ipsum;
+# обычный текст в скобках вроде [1, 2, 3...] заглушкой не считается
+PLACEHOLDER_RE = re.compile(
+    r"\[\s*(?:TODO|TBD|встав\w*|добав\w*|впиш\w*|укаж\w*)\b[^\]]*\]|lorem ipsum", re.IGNORECASE
+)
+EMOJI_RE = re.compile("[\U0001F300-\U0001FAFF\u2600-\u27BF]")
+HASHTAG_RE = re.compile(r"(?:^|\s)#\w+")
+# План без хэштегов: "нет", "без хэштегов", "хэштеги не нужны", "не использовать" и т.п.
+NO_HASHTAGS_RE = re.compile(r"^(?:нет|без|no|none|0)\b|\bне\s+(?:нуж|использ|добавл|став)", re.IGNORECASE)
+
+# Тексты шаблонов промптов; переменные подставляются через str.format в prompt_messages
+ANALYSIS_INTRO = """Ты — контент-аналитик и эксперт по созданию вовлекающего контента.
 
 Тема поста: {topic}
 Исходный материал: {source_text}
 
-Выполни детальный анализ и определи:
+"""
+
+GOAL_TEMPLATE = (
+    ANALYSIS_INTRO + """Определи:
 1. Основная цель поста (информирование, привлечение внимания, обучение, развлечение)
-2. Целевая аудитория (кто будет читать этот пост)
-3. Ключевые сообщения (что важно донести)
-4. Тон и стиль (формальный, дружеский, профессиональный, эмоциональный)
-5. Желаемая длина (short - до 500 символов, medium - 500-1500, long - 1500+)
+2. Ключевые сообщения (что важно донести)
 
 ВАЖНО: Отвечай строго в формате JSON со следующими полями:
 {{
   "post_goal": "...",
+  "key_messages": "..."
+}}"""
+)
+
+AUDIENCE_TEMPLATE = (
+    ANALYSIS_INTRO + """Определи:
+1. Целевая аудитория (кто будет читать этот пост)
+2. Тон и стиль (формальный, дружеский, профессиональный, эмоциональный)
+
+ВАЖНО: Отвечай строго в формате JSON со следующими полями:
+{{
   "target_audience": "...",
-  "key_messages": "...",
-  "tone_style": "...",
-  "desired_length": "short|medium|long"
+  "tone_style": "..."
 }}"""
-    )
-    
-    chain = prompt | llm | SimpleJsonOutputParser()
-    
-    try:
-        result = chain.invoke({
-            "topic": topic,
-            "source_text": source_text if source_text else "Не предоставлен"
-        })
-        logger.info(f"Analysis chain завершен: goal={result.get('post_goal', 'N/A')}")
-        return result
-    except Exception as e:
-        logger.warning(f"Ошибка парсинга в analysis_chain: {e}. Используются значения по умолчанию")
-        return {
-            "post_goal": "Информирование",
-            "target_audience": "Широкая аудитория",
-            "key_messages": "Основная информация по теме",
-            "tone_style": "Нейтральный",
-            "desired_length": "medium"
-        }
+)
 
+LENGTH_TEMPLATE = (
+    ANALYSIS_INTRO + """Определи желаемую длину поста (short - до 500 символов, medium - 500-1500, long - 1500+).
 
-def style_selection_chain(analysis: dict, topic: str) -> dict:
-    """
-    Цепочка 2: Подбор стиля и формата
-    """
-    logger.info("Запуск style_selection_chain")
-    llm = create_llm()
-    
-    prompt = ChatPromptTemplate.from_template(
-        """Ты — копирайтер и специалист по контент-маркетингу.
+ВАЖНО: Отвечай строго в формате JSON со следующими полями:
+{{
+  "desired_length": "short|medium|long"
+}}"""
+)
+
+STYLE_TEMPLATE = (
+    """Ты — копирайтер и специалист по контент-маркетингу.
 
 Тема поста: {topic}
 
@@ -139,42 +155,10 @@ def style_selection_chain(analysis: dict, topic: str) -> dict:
   "hashtags": "...",
   "formatting": "..."
 }}"""
-    )
-    
-    chain = prompt | llm | SimpleJsonOutputParser()
-    
-    try:
-        result = chain.invoke({
-            "topic": topic,
-            "post_goal": analysis.get("post_goal", ""),
-            "target_audience": analysis.get("target_audience", ""),
-            "key_messages": analysis.get("key_messages", ""),
-            "tone_style": analysis.get("tone_style", ""),
-            "desired_length": analysis.get("desired_length", "medium")
-        })
-        logger.info(f"Style selection завершен: emoji={result.get('use_emoji', 'N/A')}")
-        return result
-    except Exception as e:
-        logger.warning(f"Ошибка парсинга в style_selection_chain: {e}. Используются значения по умолчанию")
-        return {
-            "structure": "Заголовок, основной текст, заключение",
-            "use_emoji": "no",
-            "emoji_style": "",
-            "cta": "Нет",
-            "hashtags": "Нет",
-            "formatting": "Абзацы"
-        }
+)
 
-
-def structure_chain(analysis: dict, style: dict, topic: str) -> dict:
-    """
-    Цепочка 3: Создание структуры контента
-    """
-    logger.info("Запуск structure_chain")
-    llm = create_llm()
-    
-    prompt = ChatPromptTemplate.from_template(
-        """Ты — редактор и структурный аналитик контента.
+STRUCTURE_TEMPLATE = (
+    """Ты — редактор и структурный аналитик контента.
 
 Тема поста: {topic}
 
@@ -204,70 +188,72 @@ def structure_chain(analysis: dict, style: dict, topic: str) -> dict:
   "conclusion": "...",
   "cta_text": "..."
 }}"""
-    )
-    
-    chain = prompt | llm | SimpleJsonOutputParser()
-    
-    try:
-        result = chain.invoke({
-            "topic": topic,
-            "post_goal": analysis.get("post_goal", ""),
-            "target_audience": analysis.get("target_audience", ""),
-            "tone_style": analysis.get("tone_style", ""),
-            "structure": style.get("structure", ""),
-            "use_emoji": style.get("use_emoji", "no"),
-            "cta": style.get("cta", ""),
-            "hashtags": style.get("hashtags", "")
-        })
-        logger.info(f"Structure chain завершен: headline={result.get('headline', 'N/A')[:50]}")
-        return result
-    except Exception as e:
-        logger.warning(f"Ошибка парсинга в structure_chain: {e}. Используются значения по умолчанию")
-        return {
-            "headline": "Заголовок",
-            "intro": "Вступление",
-            "main_blocks": "Основной контент",
-            "conclusion": "Заключение",
-            "cta_text": ""
-        }
+)
 
-
-def content_generation_chain(
-    analysis: dict, 
-    style: dict, 
-    structure: dict, 
-    topic: str,
-    source_text: str = ""
-) -> str:
-    """
-    Цепочка 4: Генерация финального поста
-    """
-    logger.info("Запуск content_generation_chain")
-    llm = create_llm()
-    
-    prompt = ChatPromptTemplate.from_template(
-        """Ты — профессиональный копирайтер и создатель вовлекающего контента.
+PLAN_TEMPLATE = (
+    """Ты — контент-аналитик, копирайтер и редактор вовлекающего контента.
 
 Тема поста: {topic}
 Исходный материал: {source_text}
 
-АНАЛИЗ:
-- Цель: {post_goal}
-- Аудитория: {target_audience}
-- Тон: {tone_style}
-- Длина: {desired_length}
+За один проход подготовь план поста из трех разделов.
 
-СТИЛЬ:
-- Структура: {structure_format}
-- Emoji: {use_emoji}
-- Форматирование: {formatting}
+Раздел "analysis" - анализ темы:
+1. Основная цель поста (информирование, привлечение внимания, обучение, развлечение)
+2. Ключевые сообщения (что важно донести)
+3. Целевая аудитория (кто будет читать этот пост)
+4. Тон и стиль (формальный, дружеский, профессиональный, эмоциональный)
+5. Желаемая длина поста (short - до 500 символов, medium - 500-1500, long - 1500+)
 
-СТРУКТУРА КОНТЕНТА:
-- Заголовок: {headline}
-- Вступление: {intro}
-- Основные блоки: {main_blocks}
-- Заключение: {conclusion}
-- CTA: {cta_text}
+Раздел "style" - оптимальный формат и стиль с учетом анализа:
+1. Структура поста (с заголовками, списками, абзацами и т.д.)
+2. Использование emoji (да/нет и какие)
+3. Призыв к действию (CTA) - нужен ли и какой
+4. Хэштеги (нужны ли, сколько, какие темы)
+5. Форматирование (жирный текст, курсив, подзаголовки)
+
+Раздел "structure" - детальная структура контента с учетом анализа и стиля:
+1. Заголовок (цепляющий, информативный)
+2. Вступление (хук, привлекающий внимание)
+3. Основные блоки (2-5 смысловых блоков)
+4. Заключение (подведение итогов)
+5. Призыв к действию (если нужен)
+
+ВАЖНО: Отвечай строго в формате JSON со следующими полями:
+{{
+  "analysis": {{
+    "post_goal": "...",
+    "key_messages": "...",
+    "target_audience": "...",
+    "tone_style": "...",
+    "desired_length": "short|medium|long"
+  }},
+  "style": {{
+    "structure": "...",
+    "use_emoji": "yes|no",
+    "emoji_style": "...",
+    "cta": "...",
+    "hashtags": "...",
+    "formatting": "..."
+  }},
+  "structure": {{
+    "headline": "...",
+    "intro": "...",
+    "main_blocks": "...",
+    "conclusion": "...",
+    "cta_text": "..."
+  }}
+}}"""
+)
+
+CONTENT_TEMPLATE = (
+    """Ты — профессиональный копирайтер и создатель вовлекающего контента.
+
+Тема поста: {topic}
+Исходный материал: {source_text}
+
+ПЛАН ПОСТА (JSON: analysis - анализ, style - стиль, structure - структура контента):
+{plan_json}
 
 Сгенерируй ПОЛНЫЙ готовый пост.
 
@@ -282,42 +268,10 @@ def content_generation_chain(
 8. Весь контент ПОЛНОСТЬЮ написан
 
 Верни ТОЛЬКО текст поста, без объяснений."""
-    )
-    
-    chain = prompt | llm | StrOutputParser()
-    
-    result = chain.invoke({
-        "topic": topic,
-        "source_text": source_text if source_text else "Не предоставлен",
-        "post_goal": analysis.get("post_goal", ""),
-        "target_audience": analysis.get("target_audience", ""),
-        "tone_style": analysis.get("tone_style", ""),
-        "desired_length": analysis.get("desired_length", "medium"),
-        "structure_format": style.get("structure", ""),
-        "use_emoji": style.get("use_emoji", "no"),
-        "formatting": style.get("formatting", ""),
-        "headline": structure.get("headline", ""),
-        "intro": structure.get("intro", ""),
-        "main_blocks": structure.get("main_blocks", ""),
-        "conclusion": structure.get("conclusion", ""),
-        "cta_text": structure.get("cta_text", "")
-    })
-    
-    post_content = result.strip()
-    logger.info(f"Content generation завершен: {len(post_content)} символов")
-    return post_content
-
+)
 
-def review_chain(post_content: str) -> dict:
-    """
-    Цепочка 5: Финальная проверка контента
-    """
-    logger.info("Запуск review_chain")
-    logger.debug(f"Проверка поста: {len(post_content)} символов")
-    llm = create_llm()
-    
-    prompt = ChatPromptTemplate.from_template(
-        """Ты — редактор и эксперт по качеству контента.
+REVIEW_TEMPLATE = (
+    """Ты — редактор и эксперт по качеству контента.
 
 Проверь следующий пост:
 
@@ -338,119 +292,846 @@ def review_chain(post_content: str) -> dict:
   "engagement": "...",
   "recommendations": "..."
 }}"""
+)
+
+class GoalOut(BaseModel):
+    """Цель поста и ключевые сообщения"""
+    post_goal: str
+    key_messages: str
+
+
+class AudienceOut(BaseModel):
+    """Целевая аудитория и тон"""
+    target_audience: str
+    tone_style: str
+
+
+class LengthOut(BaseModel):
+    """Желаемая длина поста"""
+    desired_length: Literal["short", "medium", "long"]
+
+
+class AnalysisOut(BaseModel):
+    """Анализ темы поста"""
+    post_goal: str
+    key_messages: str
+    target_audience: str
+    tone_style: str
+    desired_length: Literal["short", "medium", "long"]
+
+
+class StyleOut(BaseModel):
+    """Стиль и формат поста"""
+    structure: str
+    use_emoji: Literal["yes", "no"]
+    emoji_style: str
+    cta: str
+    hashtags: str
+    formatting: str
+
+
+class StructureOut(BaseModel):
+    """Структура контента"""
+    headline: str
+    intro: str
+    main_blocks: str
+    conclusion: str
+    cta_text: str
+
+
+class PlanOut(BaseModel):
+    """План поста: анализ, стиль и структура"""
+    analysis: AnalysisOut
+    style: StyleOut
+    structure: StructureOut
+
+
+class ReviewOut(BaseModel):
+    """Результат проверки поста"""
+    is_ready: Literal["yes", "no"]
+    completeness: str
+    structure_quality: str
+    engagement: str
+    recommendations: str
+
+
+def setup_logger() -> None:
+    """Настройка логирования"""
+    level_name = os.getenv("LOG_LEVEL", "INFO").upper()
+    level = getattr(logging, level_name, logging.INFO)
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s %(levelname)s %(name)s - %(message)s",
     )
+
+
+def json_loads(data: bytes):
+    """Разбирает JSON из bytes (через orjson, если он установлен)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj) -> bytes:
+    """Сериализует объект в JSON в кодировке UTF-8 (через orjson, если он установлен)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def setup_llm_cache() -> None:
+    """Включает SQLite-кэш ответов LLM (LLM_CACHE=0 отключает)"""
+    if os.getenv("LLM_CACHE", "1") != "1":
+        return
+    try:
+        from langchain_community.cache import SQLiteCache
+    except ImportError:
+        logger.warning("langchain-community не установлен, кэш ответов LLM отключен")
+        return
+    from langchain_core.globals import set_llm_cache
+    set_llm_cache(SQLiteCache(database_path=LLM_CACHE_PATH))
+    logger.debug(f"Кэш ответов LLM: {LLM_CACHE_PATH}")
+
+
+class StageCache:
+    """
+    Кэш промежуточных этапов analysis, style и structure
     
-    chain = prompt | llm | SimpleJsonOutputParser()
+    Точный кэш (POST_STAGE_CACHE=1, включен по умолчанию) возвращает результат этапа
+    для той же темы, того же исходного материала и той же модели.
     
-    try:
-        result = chain.invoke({"post_content": post_content})
-        logger.info(f"Review chain завершен: is_ready={result.get('is_ready', 'N/A')}")
-        return result
-    except Exception as e:
-        logger.warning(f"Ошибка парсинга в review_chain: {e}. Используются значения по умолчанию")
-        return {
-            "is_ready": "yes",
-            "completeness": "Пост завершен",
-            "structure_quality": "Хорошая структура",
-            "engagement": "Достаточно вовлекающий",
-            "recommendations": "Пост готов к публикации"
+    Семантический кэш (включается через POST_CACHE_SEMANTIC=1): для темы поста один раз
+    вычисляется эмбеддинг; результаты этапов переиспользуются, если в кэше есть тема
+    с косинусной близостью не ниже POST_CACHE_THRESHOLD и тем же исходным материалом.
+    """
+    
+    def __init__(self, cache_file: Path = STAGE_CACHE_FILE, cache_dir: Path = STAGE_CACHE_DIR):
+        self.cache_file = cache_file
+        self.cache_dir = cache_dir
+        self.exact = os.getenv("POST_STAGE_CACHE", "1") == "1"
+        self.enabled = os.getenv("POST_CACHE_SEMANTIC", "0") == "1"
+        self.threshold = float(os.getenv("POST_CACHE_THRESHOLD", "0.92"))
+        self._entries: Optional[List[Dict]] = None
+        self._embedding: Optional[List[float]] = None
+        self._source = ""
+        self._run_key = ""
+    
+    async def prepare(self, topic: str, source_text: str) -> None:
+        """Запоминает ключ точного кэша и вычисляет эмбеддинг темы (один запрос на генерацию)"""
+        if self.exact:
+            self._run_key = f"{CONFIG.fast_model}|{topic}|{source_text}"
+        if not self.enabled:
+            return
+        self._source = hashlib.sha256(source_text.encode('utf-8')).hexdigest()
+        try:
+            from langchain_openai import OpenAIEmbeddings
+            embeddings = OpenAIEmbeddings(
+                api_key=CONFIG.api_key,
+                base_url=CONFIG.base_url,
+                model=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"),
+                http_async_client=_get_http_client()
+            )
+            self._embedding = self.normalize(await embeddings.aembed_query(topic[:200]))
+        except Exception as e:
+            logger.warning(f"Не удалось получить эмбеддинг темы, семантический кэш отключен: {e}")
+            self._embedding = None
+    
+    def _path(self, stage: str) -> Path:
+        """Файл точного кэша этапа для текущего запуска"""
+        key = hashlib.blake2b(f"{stage}|{self._run_key}".encode('utf-8'), digest_size=16).hexdigest()
+        return self.cache_dir / f"{key}.json"
+    
+    def get(self, stage: str) -> Optional[Dict]:
+        """
+        Возвращает результат этапа из точного кэша, иначе для самой близкой темы,
+        если близость не ниже порога
+        """
+        if self._run_key:
+            try:
+                result = json_loads(self._path(stage).read_bytes())
+                logger.info(f"{stage}: результат взят из кэша этапов")
+                return result
+            except (OSError, ValueError):
+                pass
+        if self._embedding is None:
+            return None
+        best = None
+        best_score = self.threshold
+        for entry in self._load():
+            if entry["stage"] != stage or entry["source"] != self._source:
+                continue
+            score = sum(map(operator.mul, entry["embedding"], self._embedding))
+            if score >= best_score:
+                best, best_score = entry["result"], score
+        if best is not None:
+            logger.info(f"{stage}: результат взят из семантического кэша (близость {best_score:.3f})")
+        return best
+    
+    def set(self, stage: str, result: Dict) -> None:
+        """Сохраняет результат этапа для темы текущего запуска"""
+        if self._run_key:
+            try:
+                self.cache_dir.mkdir(exist_ok=True)
+                self._path(stage).write_bytes(json_dumps(result))
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить кэш этапов: {e}")
+        if self._embedding is None:
+            return
+        entries = self._load()
+        entries.append({
+            "stage": stage,
+            "source": self._source,
+            "embedding": self._embedding,
+            "result": result
+        })
+        try:
+            self.cache_file.write_bytes(json_dumps(entries))
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить семантический кэш: {e}")
+    
+    def _load(self) -> List[Dict]:
+        """Загружает записи кэша (один раз за запуск)"""
+        if self._entries is None:
+            try:
+                self._entries = json_loads(self.cache_file.read_bytes())
+            except Exception:
+                self._entries = []
+        return self._entries
+    
+    @staticmethod
+    def normalize(embedding: List[float]) -> List[float]:
+        """Приводит вектор к единичной длине, чтобы скалярное произведение было косинусом"""
+        norm = math.sqrt(sum(x * x for x in embedding))
+        if not norm:
+            return embedding
+        return [x / norm for x in embedding]
+
+
+stage_cache = StageCache()
+
+
+@dataclass(frozen=True)
+class LLMConfig:
+    """Параметры подключения к LLM, читаются из окружения один раз при загрузке модуля"""
+    api_key: Optional[str]
+    base_url: Optional[str]
+    fast_model: str
+    content_model: str
+    temperature: float = 0.7
+    
+    @classmethod
+    def from_env(cls) -> "LLMConfig":
+        return cls(
+            api_key=os.getenv("OPENAI_API_KEY") or None,
+            base_url=(os.getenv("OPENAI_BASE_URL") or "").strip() or None,
+            fast_model=os.getenv("OPENAI_MODEL_FAST", "gpt-4o-mini"),
+            content_model=os.getenv("OPENAI_MODEL_CONTENT") or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        )
+    
+    def model_for(self, role: str) -> str:
+        """
+        Возвращает модель для роли цепочки
+        
+        Args:
+            role: "fast" - анализ, стиль, структура и проверка (OPENAI_MODEL_FAST),
+                  "content" - генерация поста (OPENAI_MODEL_CONTENT, иначе OPENAI_MODEL)
+        """
+        return self.fast_model if role == "fast" else self.content_model
+    
+    def to_kwargs(self, model: str) -> dict:
+        """Аргументы ChatOpenAI для указанной модели"""
+        kwargs = {
+            "api_key": self.api_key,
+            "model": model,
+            "temperature": self.temperature
         }
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+        return kwargs
+
+
+CONFIG = LLMConfig.from_env()
+
+
+def _get_http_client() -> "httpx.AsyncClient":
+    """Возвращает общий асинхронный HTTP клиент (создается при первом обращении)"""
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.AsyncClient(limits=httpx.Limits(**HTTP_LIMITS), http2=HTTP2_ENABLED)
+    return _http_client
+
+
+def prompt_messages(template: str, **values: str) -> List["HumanMessage"]:
+    """
+    Сообщения для LLM по шаблону: подстановка через str.format без ChatPromptTemplate
+    (результат тот же, что у ChatPromptTemplate.from_template(template).format_messages)
+    """
+    from langchain_core.messages import HumanMessage
+    return [HumanMessage(content=template.format(**values))]
+
 
+@lru_cache(maxsize=2)
+def _build_llm(model: str) -> "ChatOpenAI":
+    """Создает LLM один раз на модель, чтобы цепочки делили пул соединений"""
+    from langchain_openai import ChatOpenAI
+    if CONFIG.base_url:
+        logger.debug(f"Используется ProxyAPI: {CONFIG.base_url}")
+    logger.debug(f"Создан LLM клиент: model={model}, temperature={CONFIG.temperature}")
+    return ChatOpenAI(**CONFIG.to_kwargs(model), http_async_client=_get_http_client())
 
-def generate_post(topic: str, source_text: str = "") -> str:
-    """
-    Главная функция: запускает полную цепочку генерации поста (4 этапа + проверка)
-    """
-    logger.info("="*80)
-    logger.info("Запуск генерации текстового поста")
-    logger.info(f"Тема: {topic}")
-    logger.info("="*80)
-    
-    print("\n" + "="*80)
-    print("📝 ГЕНЕРАТОР ТЕКСТОВЫХ ПОСТОВ (LangChain Pipeline)")
-    print("="*80)
-    
-    # Шаг 1: Анализ темы
-    print("\n📊 ШАГ 1/4: Анализ темы и материала...")
-    analysis = analysis_chain(topic, source_text)
-    print("✅ Анализ завершен")
-    print(f"   • Цель: {analysis.get('post_goal', 'N/A')}")
-    print(f"   • Аудитория: {analysis.get('target_audience', 'N/A')}")
-    print(f"   • Тон: {analysis.get('tone_style', 'N/A')}")
-    
-    # Шаг 2: Подбор стиля
-    print("\n🎨 ШАГ 2/4: Подбор стиля и формата...")
-    style = style_selection_chain(analysis, topic)
-    print("✅ Стиль подобран")
-    structure_info = style.get('structure', 'N/A')
-    if len(str(structure_info)) > 50:
-        print(f"   • Структура: {str(structure_info)[:50]}...")
-    else:
-        print(f"   • Структура: {structure_info}")
-    print(f"   • Emoji: {style.get('use_emoji', 'N/A')}")
-    cta_info = style.get('cta', 'N/A')
-    if len(str(cta_info)) > 50:
-        print(f"   • CTA: {str(cta_info)[:50]}...")
-    else:
-        print(f"   • CTA: {cta_info}")
-    
-    # Шаг 3: Создание структуры
-    print("\n🏗️ ШАГ 3/4: Создание структуры контента...")
-    structure = structure_chain(analysis, style, topic)
-    print("✅ Структура создана")
-    headline = structure.get('headline', 'N/A')
-    if len(headline) > 60:
-        print(f"   • Заголовок: {headline[:60]}...")
-    else:
-        print(f"   • Заголовок: {headline}")
-    
-    # Шаг 4: Генерация контента
-    print("\n✍️ ШАГ 4/4: Генерация финального поста...")
-    post_content = content_generation_chain(analysis, style, structure, topic, source_text)
-    print("✅ Пост сгенерирован")
-    print(f"   • Размер: {len(post_content)} символов")
-    print(f"   • Строк: {len(post_content.splitlines())}")
-    
-    # Финальная проверка
-    print("\n🔍 ФИНАЛЬНАЯ ПРОВЕРКА: Валидация контента...")
-    review = review_chain(post_content)
-    print("✅ Проверка завершена")
-    print(f"   • Готовность: {review.get('is_ready', 'yes')}")
-    structure_quality = review.get('structure_quality', 'N/A')
-    if len(str(structure_quality)) > 50:
-        print(f"   • Качество структуры: {str(structure_quality)[:50]}...")
-    else:
-        print(f"   • Качество структуры: {structure_quality}")
+
+def create_llm(role: str = "content"):
+    """
+    Возвращает общий для цепочек одной роли экземпляр LLM
     
-    if review.get('recommendations') and review.get('recommendations') != 'Пост готов к публикации':
-        print(f"\n💡 Рекомендации: {review.get('recommendations')}")
+    Args:
+        role: "fast" - модель для JSON-цепочек, "content" - модель для генерации поста
+    """
+    if not CONFIG.api_key:
+        logger.error("OPENAI_API_KEY не найден в .env файле!")
+        print("❌ OPENAI_API_KEY не найден в .env файле!")
+        sys.exit(1)
+    
+    return _build_llm(CONFIG.model_for(role))
+
+
+def structured_llm(schema):
+    """
+    Быстрая модель с ответом строго по JSON-схеме модели pydantic: OpenAI ограничивает
+    генерацию схемой, поэтому ответ всегда разбирается без исправлений
+    """
+    return create_llm("fast").with_structured_output(schema, method="json_schema", strict=True)
+
+
+async def close_llm() -> None:
+    """
+    Закрывает общий HTTP клиент и сбрасывает кэш LLM.
+    
+    Клиент привязан к циклу событий, а asyncio.run создает новый цикл
+    на каждый запуск, поэтому соединения живут в пределах одного запуска.
+    """
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    _build_llm.cache_clear()
+
+
+async def analysis_chain(topic: str, source_text: str = "") -> dict:
+    """
+    Цепочка 1: Анализ темы и исходного материала
+    
+    Анализ разбит на три независимых вопроса (цель и ключевые сообщения, аудитория и тон,
+    длина), которые отправляются в LLM параллельно
+    """
+    logger.info("Запуск analysis_chain")
+    logger.debug(f"Тема: {topic[:100]}...")
+    cached = stage_cache.get("analysis")
+    if cached is not None:
+        return cached
+    values = {
+        "topic": topic,
+        "source_text": source_text if source_text else "Не предоставлен"
+    }
+    
+    parts = await asyncio.gather(
+        structured_llm(GoalOut).ainvoke(prompt_messages(GOAL_TEMPLATE, **values)),
+        structured_llm(AudienceOut).ainvoke(prompt_messages(AUDIENCE_TEMPLATE, **values)),
+        structured_llm(LengthOut).ainvoke(prompt_messages(LENGTH_TEMPLATE, **values))
+    )
+    result = {}
+    for part in parts:
+        result.update(part.model_dump())
+    logger.info(f"Analysis chain завершен: goal={result.get('post_goal', 'N/A')}")
+    stage_cache.set("analysis", result)
+    return result
+
+
+async def style_selection_chain(analysis: dict, topic: str) -> dict:
+    """
+    Цепочка 2: Подбор стиля и формата
+    """
+    logger.info("Запуск style_selection_chain")
+    cached = stage_cache.get("style")
+    if cached is not None:
+        return cached
+    result = await structured_llm(StyleOut).ainvoke(prompt_messages(
+        STYLE_TEMPLATE,
+        topic=topic,
+        post_goal=analysis.get("post_goal", ""),
+        target_audience=analysis.get("target_audience", ""),
+        key_messages=analysis.get("key_messages", ""),
+        tone_style=analysis.get("tone_style", ""),
+        desired_length=analysis.get("desired_length", "medium")
+    ))
+    result = result.model_dump()
+    logger.info(f"Style selection завершен: emoji={result.get('use_emoji', 'N/A')}")
+    stage_cache.set("style", result)
+    return result
+
+
+async def structure_chain(analysis: dict, style: dict, topic: str) -> dict:
+    """
+    Цепочка 3: Создание структуры контента
+    """
+    logger.info("Запуск structure_chain")
+    cached = stage_cache.get("structure")
+    if cached is not None:
+        return cached
+    result = await structured_llm(StructureOut).ainvoke(prompt_messages(
+        STRUCTURE_TEMPLATE,
+        topic=topic,
+        post_goal=analysis.get("post_goal", ""),
+        target_audience=analysis.get("target_audience", ""),
+        tone_style=analysis.get("tone_style", ""),
+        structure=style.get("structure", ""),
+        use_emoji=style.get("use_emoji", "no"),
+        cta=style.get("cta", ""),
+        hashtags=style.get("hashtags", "")
+    ))
+    result = result.model_dump()
+    logger.info(f"Structure chain завершен: headline={result.get('headline', 'N/A')[:50]}")
+    stage_cache.set("structure", result)
+    return result
+
+
+async def plan_chain(topic: str, source_text: str = "") -> dict:
+    """
+    Цепочки 1-3 одним запросом: анализ, подбор стиля и структура контента.
+    
+    Разделы, которые не удалось разобрать, добираются отдельными цепочками.
+    """
+    logger.info("Запуск plan_chain")
+    result = {}
+    for name in ("analysis", "style", "structure"):
+        cached = stage_cache.get(name)
+        if cached is not None:
+            result[name] = cached
+    if len(result) < 3:
+        try:
+            plan = await structured_llm(PlanOut).ainvoke(prompt_messages(
+                PLAN_TEMPLATE,
+                topic=topic,
+                source_text=source_text if source_text else "Не предоставлен"
+            ))
+            for name, value in plan.model_dump().items():
+                if name not in result:
+                    result[name] = value
+                    stage_cache.set(name, value)
+        except Exception as e:
+            logger.warning(f"Ошибка в plan_chain: {e}. Используются отдельные цепочки")
+    
+    return await complete_plan(topic, source_text, result)
+
+
+async def complete_plan(topic: str, source_text: str, result: dict) -> dict:
+    """Добирает отдельными цепочками разделы плана, которые не удалось разобрать"""
+    def section(name: str) -> Optional[dict]:
+        value = result.get(name)
+        return value if isinstance(value, dict) and value else None
+    
+    analysis = section("analysis")
+    if analysis is None:
+        logger.warning("В плане нет раздела analysis, запускается analysis_chain")
+        analysis = await analysis_chain(topic, source_text)
+    style = section("style")
+    if style is None:
+        logger.warning("В плане нет раздела style, запускается style_selection_chain")
+        style = await style_selection_chain(analysis, topic)
+    structure = section("structure")
+    if structure is None:
+        logger.warning("В плане нет раздела structure, запускается structure_chain")
+        structure = await structure_chain(analysis, style, topic)
+    
+    logger.info(f"Plan chain завершен: goal={analysis.get('post_goal', 'N/A')}")
+    return {"analysis": analysis, "style": style, "structure": structure}
+
+
+def build_plan_json(analysis: dict, style: dict, structure: dict) -> str:
+    """
+    Собирает компактный JSON плана для промпта генерации: только поля из PLAN_FIELDS,
+    без пустых значений
+    """
+    sections = {"analysis": analysis, "style": style, "structure": structure}
+    plan = {}
+    for name, fields in PLAN_FIELDS.items():
+        values = {}
+        for field in fields:
+            value = str(sections[name].get(field, "")).strip()
+            if value.lower() not in EMPTY_VALUES:
+                values[field] = value
+        plan[name] = values
+    return json_dumps(plan).decode('utf-8')
+
+
+async def content_generation_chain(
+    analysis: dict, 
+    style: dict, 
+    structure: dict, 
+    topic: str,
+    source_text: str = ""
+) -> str:
+    """
+    Цепочка 4: Генерация финального поста
+    """
+    logger.info("Запуск content_generation_chain")
+    from langchain_core.output_parsers import StrOutputParser
+    llm = create_llm()
+    
+    chain = llm | StrOutputParser()
+    
+    # Пост выводится по мере генерации, чтобы не ждать последнего токена
+    parts = []
+    async for chunk in chain.astream(prompt_messages(
+        CONTENT_TEMPLATE,
+        topic=topic,
+        source_text=source_text if source_text else "Не предоставлен",
+        plan_json=build_plan_json(analysis, style, structure)
+    )):
+        parts.append(chunk)
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+    print()
+    
+    post_content = "".join(parts).strip()
+    logger.info(f"Content generation завершен: {len(post_content)} символов")
+    return post_content
+
+
+async def review_chain(post_content: str) -> dict:
+    """
+    Цепочка 5: Финальная проверка контента
+    """
+    logger.info("Запуск review_chain")
+    logger.debug(f"Проверка поста: {len(post_content)} символов")
+    result = await structured_llm(ReviewOut).ainvoke(prompt_messages(REVIEW_TEMPLATE, post_content=post_content))
+    result = result.model_dump()
+    logger.info(f"Review chain завершен: is_ready={result.get('is_ready', 'N/A')}")
+    return result
+
+
+def _quick_review(post_content: str, analysis: dict, style: dict) -> Optional[dict]:
+    """
+    Локальная проверка поста без обращения к LLM: заглушки, длина, emoji и хэштеги
+    по плану
+    
+    Returns:
+        Словарь в том же формате, что и у review_chain, если все проверки пройдены, иначе None
+    """
+    issues = []
+    if PLACEHOLDER_RE.search(post_content):
+        issues.append("заглушки в тексте")
+    low, high = LENGTH_BOUNDS.get(analysis.get("desired_length"), LENGTH_BOUNDS["medium"])
+    if len(post_content) < low or (high is not None and len(post_content) > high):
+        issues.append(f"длина {len(post_content)} символов")
+    if style.get("use_emoji") == "yes" and not EMOJI_RE.search(post_content):
+        issues.append("нет emoji")
+    hashtags = str(style.get("hashtags", "")).strip().lower()
+    hashtags_planned = hashtags not in EMPTY_VALUES and not NO_HASHTAGS_RE.search(hashtags)
+    if hashtags_planned and not HASHTAG_RE.search(post_content):
+        issues.append("нет хэштегов")
     
-    # Сохранение файла
+    if issues:
+        logger.info(f"Локальная проверка не пройдена: {', '.join(issues)}")
+        return None
+    return {
+        "is_ready": "yes",
+        "completeness": "Пост завершен",
+        "structure_quality": "Проверено локально",
+        "engagement": "Не оценивалась",
+        "recommendations": "Пост готов к публикации"
+    }
+
+
+async def review_post(post_content: str, analysis: dict, style: dict) -> dict:
+    """Проверка поста: review_chain вызывается, только если не пройдена локальная проверка"""
+    review = _quick_review(post_content, analysis, style)
+    if review is not None:
+        logger.info("Локальная проверка пройдена, review_chain пропущен")
+        return review
+    return await review_chain(post_content)
+
+
+def save_post(output_file: str, topic: str, post_content: str) -> None:
+    """Сохраняет пост в файл с заголовком (тема и дата генерации) одной операцией записи"""
+    header = (
+        f"# ТЕМА: {topic}\n"
+        f"# Дата генерации: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        + "="*80 + "\n\n"
+    )
+    Path(output_file).write_text(header + post_content, encoding='utf-8')
+
+
+def _trunc(value, limit: int = 50) -> str:
+    """Строка для вывода в консоль, обрезанная до limit символов"""
+    text = str(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def write_lines(lines: List[str]) -> None:
+    """Выводит набор строк одной операцией записи в stdout"""
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+async def generate_post(topic: str, source_text: str = "") -> str:
+    """
+    Главная функция: запускает полную цепочку генерации поста (план, генерация + проверка)
+    
+    Вывод каждого шага собирается в список строк и пишется в stdout одной операцией;
+    подробности этапов выводятся только при VERBOSE=1
+    """
+    logger.info(f"Запуск генерации текстового поста, тема: {topic}")
+    
+    write_lines([
+        "",
+        "="*80,
+        "📝 ГЕНЕРАТОР ТЕКСТОВЫХ ПОСТОВ (LangChain Pipeline)",
+        "="*80,
+        "",
+        # Шаг 1: План поста (анализ, стиль и структура одним запросом)
+        "📊 ШАГ 1/2: Анализ темы, подбор стиля и структура контента...",
+    ])
+    
+    await stage_cache.prepare(topic, source_text)
+    plan = await plan_chain(topic, source_text)
+    analysis, style, structure = plan["analysis"], plan["style"], plan["structure"]
+    
+    lines = ["✅ Анализ завершен"]
+    if VERBOSE:
+        lines += [
+            f"   • Цель: {analysis.get('post_goal', 'N/A')}",
+            f"   • Аудитория: {analysis.get('target_audience', 'N/A')}",
+            f"   • Тон: {analysis.get('tone_style', 'N/A')}",
+        ]
+    lines.append("✅ Стиль подобран")
+    if VERBOSE:
+        lines += [
+            f"   • Структура: {_trunc(style.get('structure', 'N/A'))}",
+            f"   • Emoji: {style.get('use_emoji', 'N/A')}",
+            f"   • CTA: {_trunc(style.get('cta', 'N/A'))}",
+        ]
+    lines.append("✅ Структура создана")
+    if VERBOSE:
+        lines.append(f"   • Заголовок: {_trunc(structure.get('headline', 'N/A'), 60)}")
+    
+    # Шаг 2: Генерация контента
+    lines += [
+        "",
+        "✍️ ШАГ 2/2: Генерация финального поста...",
+        "",
+        "📄 СОДЕРЖИМОЕ ПОСТА:",
+        "-"*80,
+    ]
+    write_lines(lines)
+    post_content = await content_generation_chain(analysis, style, structure, topic, source_text)
+    lines = ["-"*80, "✅ Пост сгенерирован"]
+    if VERBOSE:
+        line_count = post_content.count("\n") + 1 if post_content else 0
+        lines += [
+            f"   • Размер: {len(post_content)} символов",
+            f"   • Строк: {line_count}",
+        ]
+    
+    # Финальная проверка и сохранение файла выполняются параллельно
+    lines += ["", "🔍 ФИНАЛЬНАЯ ПРОВЕРКА: Валидация контента..."]
+    write_lines(lines)
     output_file = "generated_post.txt"
-    try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(f"# ТЕМА: {topic}\n")
-            f.write(f"# Дата генерации: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write("="*80 + "\n\n")
-            f.write(post_content)
-        logger.info(f"Пост сохранен в файл: {output_file}")
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении файла: {e}")
-        print(f"\n❌ Ошибка при сохранении файла: {e}")
+    review, save_result = await asyncio.gather(
+        review_post(post_content, analysis, style),
+        asyncio.get_running_loop().run_in_executor(None, save_post, output_file, topic, post_content),
+        return_exceptions=True
+    )
+    if isinstance(review, BaseException):
+        raise review
+    lines = ["✅ Проверка завершена", f"   • Готовность: {review.get('is_ready', 'yes')}"]
+    if VERBOSE:
+        lines.append(f"   • Качество структуры: {_trunc(review.get('structure_quality', 'N/A'))}")
+    
+    if review.get('recommendations') and review.get('recommendations') != 'Пост готов к публикации':
+        lines += ["", f"💡 Рекомендации: {review.get('recommendations')}"]
+    
+    if isinstance(save_result, BaseException):
+        logger.error(f"Ошибка при сохранении файла: {save_result}")
+        lines += ["", f"❌ Ошибка при сохранении файла: {save_result}"]
+        write_lines(lines)
         return post_content
+    logger.info(f"Пост сохранен в файл: {output_file}")
     
-    print("\n" + "="*80)
-    print(f"✅ ПОСТ УСПЕШНО СГЕНЕРИРОВАН: {output_file}")
-    print("="*80)
-    print(f"\n📄 СОДЕРЖИМОЕ ПОСТА:")
-    print("-"*80)
-    print(post_content)
-    print("-"*80)
-    print()
+    lines += [
+        "",
+        "="*80,
+        f"✅ ПОСТ УСПЕШНО СГЕНЕРИРОВАН: {output_file}",
+        "="*80,
+        "",
+    ]
+    write_lines(lines)
     
     return post_content
 
 
+async def generate_posts(topics: List[str]) -> int:
+    """
+    Пакетная генерация: каждый этап (план, пост, проверка) запрашивается для всех тем
+    сразу через abatch (не более BATCH_CONCURRENCY запросов одновременно)
+    
+    Returns:
+        Количество постов, которые не удалось сгенерировать
+    """
+    write_lines([
+        "",
+        "="*80,
+        f"📝 ПАКЕТНАЯ ГЕНЕРАЦИЯ ПОСТОВ: {len(topics)} шт.",
+        "="*80,
+    ])
+    
+    from langchain_core.output_parsers import StrOutputParser
+    config = {"max_concurrency": BATCH_CONCURRENCY}
+    inputs = [{"topic": topic, "source_text": "Не предоставлен"} for topic in topics]
+    
+    # Этап 1: планы всех постов; ошибки разбора добираются отдельными цепочками
+    parsed = await structured_llm(PlanOut).abatch(
+        [prompt_messages(PLAN_TEMPLATE, **item) for item in inputs],
+        config=config, return_exceptions=True
+    )
+    for topic, plan in zip(topics, parsed):
+        if isinstance(plan, Exception):
+            logger.warning(f"Ошибка парсинга плана для темы {topic[:50]}: {plan}. Используются отдельные цепочки")
+    # Добор планов ограничен тем же числом одновременных тем, что и abatch
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def complete_bounded(topic: str, plan) -> dict:
+        async with semaphore:
+            return await complete_plan(topic, "", {} if isinstance(plan, Exception) else plan.model_dump())
+    
+    plans = await asyncio.gather(*(
+        complete_bounded(topic, plan) for topic, plan in zip(topics, parsed)
+    ), return_exceptions=True)
+    
+    # Этап 2: тексты постов для тем с готовым планом; ошибка плана остается ошибкой темы
+    planned = [(index, item, plan) for index, (item, plan) in enumerate(zip(inputs, plans))
+               if not isinstance(plan, Exception)]
+    content_chain = create_llm() | StrOutputParser()
+    generated = await content_chain.abatch([
+        prompt_messages(CONTENT_TEMPLATE, **item,
+                        plan_json=build_plan_json(plan["analysis"], plan["style"], plan["structure"]))
+        for _, item, plan in planned
+    ], config=config, return_exceptions=True)
+    posts = list(plans)
+    for (index, _, _), post in zip(planned, generated):
+        posts[index] = post
+    
+    # Этап 3: проверка готовых постов параллельно с сохранением файлов;
+    # LLM проверяет только посты, не прошедшие локальную проверку
+    posts = [post if isinstance(post, Exception) else post.strip() for post in posts]
+    ready = [(number, topic, post) for number, (topic, post) in enumerate(zip(topics, posts), 1)
+             if not isinstance(post, Exception)]
+    reviews = {
+        number: _quick_review(post, plans[number - 1]["analysis"], plans[number - 1]["style"])
+        for number, _, post in ready
+    }
+    pending = [(number, post) for number, _, post in ready if reviews[number] is None]
+    checked, saves = await asyncio.gather(
+        structured_llm(ReviewOut).abatch(
+            [prompt_messages(REVIEW_TEMPLATE, post_content=post) for _, post in pending],
+            config=config, return_exceptions=True
+        ),
+        asyncio.gather(*(
+            asyncio.get_running_loop().run_in_executor(
+                None, save_post, f"generated_post_{number}.txt", topic, post
+            )
+            for number, topic, post in ready
+        ), return_exceptions=True)
+    )
+    for (number, _), review in zip(pending, checked):
+        reviews[number] = review if isinstance(review, Exception) else review.model_dump()
+    errors = dict(zip((number for number, _, _ in ready), saves))
+    
+    failed = 0
+    lines = []
+    for number, (topic, post) in enumerate(zip(topics, posts), 1):
+        short = _trunc(topic, 60)
+        error = post if isinstance(post, Exception) else errors[number]
+        if isinstance(error, Exception):
+            failed += 1
+            logger.error(f"Ошибка при генерации поста {number}: {error}")
+            lines += ["", f"❌ {number}. {short}", f"   Ошибка: {error}"]
+            continue
+        review = reviews[number]
+        is_ready = "N/A" if isinstance(review, Exception) else review["is_ready"]
+        lines += [
+            "",
+            f"✅ {number}. {short}",
+            f"   • Файл: generated_post_{number}.txt ({len(post)} символов)",
+            f"   • Готовность: {is_ready}",
+        ]
+    
+    lines += [
+        "",
+        "="*80,
+        f"Готово: {len(topics) - failed} из {len(topics)}",
+        "="*80,
+        "",
+    ]
+    write_lines(lines)
+    return failed
+
+
+async def run_generation(topic: str, source_text: str = "") -> str:
+    """Запускает генерацию и освобождает соединения по ее завершении"""
+    try:
+        return await generate_post(topic, source_text)
+    finally:
+        await close_llm()
+
+
+async def run_batch(topics: List[str]) -> int:
+    """Запускает пакетную генерацию и освобождает соединения по ее завершении"""
+    try:
+        return await generate_posts(topics)
+    finally:
+        await close_llm()
+
+
+def read_batch_file(path: str) -> List[str]:
+    """Читает темы постов из файла: по одной теме на строку, пустые строки пропускаются"""
+    text = Path(path).read_text(encoding="utf-8")
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def main_batch(path: Optional[str]) -> int:
+    """
+    Пакетный режим: python script_post.py --batch topics.txt
+    
+    Returns:
+        Код завершения (0 - все посты сгенерированы)
+    """
+    if not path:
+        logger.error("Не указан файл с темами")
+        print("❌ Использование: python script_post.py --batch topics.txt")
+        return 1
+    
+    try:
+        topics = read_batch_file(path)
+    except OSError as e:
+        logger.error(f"Не удалось прочитать файл {path}: {e}")
+        print(f"❌ Не удалось прочитать файл {path}: {e}")
+        return 1
+    if not topics:
+        print(f"❌ В файле {path} нет тем постов")
+        return 1
+    
+    logger.info(f"Пакетная генерация: {len(topics)} тем из {path}")
+    try:
+        failed = asyncio.run(run_batch(topics))
+    except KeyboardInterrupt:
+        logger.warning("Генерация прервана пользователем")
+        print("\n\n❌ Генерация прервана пользователем")
+        return 0
+    return 0 if failed == 0 else 1
+
+
 def main():
     """Основная функция"""
     # Настройка логирования
@@ -463,8 +1144,13 @@ def main():
         print("\nПримеры:")
         print('   python script_post.py "Искусственный интеллект в медицине"')
         print('   python script_post.py "Новая технология" "Подробный текст статьи..."')
+        print('   python script_post.py --batch topics.txt')
         sys.exit(1)
     
+    setup_llm_cache()
+    if sys.argv[1] == "--batch":
+        sys.exit(main_batch(sys.argv[2] if len(sys.argv) > 2 else None))
+    
     topic = sys.argv[1]
     source_text = sys.argv[2] if len(sys.argv) > 2 else ""
     
@@ -473,7 +1159,7 @@ def main():
         logger.info(f"Предоставлен исходный текст: {len(source_text)} символов")
     
     try:
-        generate_post(topic, source_text)
+        asyncio.run(run_generation(topic, source_text))
         logger.info("Генерация поста успешно завершена")
     except KeyboardInterrupt:
         logger.warning("Генерация прервана пользователем")